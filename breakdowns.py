@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+import fused_engine
+from client_partitions import client_hash
+from dates import parse_sheet_dates
+from metrics import (
+    DEFAULT_ENGINE,
+    METRIC1_SHEET,
+    METRIC1_REFERRALTYPE_COL,
+    METRIC2_CLIENTID_COL,
+    METRIC2_DUPLICATE_COL,
+    METRIC4_SHEET,
+    METRIC7_SHEET,
+    METRIC7_CLIENTID_COL,
+    METRIC7_TAXONOMY_COL,
+    METRIC8_INTERACTION_SHEET,
+    SHEET_DATE_COLUMNS,
+    calculate_all_metrics,
+    iter_prepared_metrics,
+)
+
+# Dimensional breakdowns: every metric for every group of one or more group-by dimensions.
+# The export is scanned once by the fused engine (fused_engine.prepare_data), which reduces each sheet to per-client
+# intermediates (enrolled clients, first screening scores, referral and first service dates, ...) and row selections.
+# The group keys of every client are computed once, each intermediate is split into all groups with one groupby, and
+# the metrics of a group are then evaluated on its slice of the intermediates (metrics.iter_prepared_metrics). The
+# work is one ungrouped scan plus a pass over the much smaller per-client data, instead of a full metric run per group.
+#
+# Groups are sets of clients, so every client keeps all of its rows together and the per-client logic stays valid:
+# - A client-level dimension (a Client column) puts each client in one group, by the value on its last Client row,
+#   the same row #8/#9 take the referral date from.
+# - A referral-level dimension (HRSN taxonomy) splits the Interaction_referral rows by their own value, and puts a
+#   client in every group it has a referral in. Groups can then overlap and do not add up to the total.
+# Sheets without a client column (Goalshortterm) cannot be split; the metrics read only from them are reported
+# for the total only.
+
+# Settings
+# - Available dimensions: sheet and column holding the value, the sheet's client ID column, and whether the value
+#   belongs to each row (True) or to the client (False).
+GROUP_DIMENSIONS = {
+    'Referral type': {'sheet': METRIC1_SHEET, 'column': METRIC1_REFERRALTYPE_COL, 'client_column': METRIC2_CLIENTID_COL, 'per_row': False},
+    'AHP client status': {'sheet': METRIC1_SHEET, 'column': METRIC2_DUPLICATE_COL, 'client_column': METRIC2_CLIENTID_COL, 'per_row': False},
+    'HRSN taxonomy': {'sheet': METRIC7_SHEET, 'column': METRIC7_TAXONOMY_COL, 'client_column': METRIC7_CLIENTID_COL, 'per_row': True},
+}
+# - Client ID column of each sheet that can be split into groups.
+GROUP_CLIENT_COLUMNS = {
+    'Client': METRIC2_CLIENTID_COL,
+    'Ahpscreening': METRIC2_CLIENTID_COL,
+    'Ahpdischarge': METRIC2_CLIENTID_COL,
+    'Interaction': METRIC2_CLIENTID_COL,
+    METRIC7_SHEET: METRIC7_CLIENTID_COL,
+}
+# - Per-client intermediates of fused_engine.prepare_data, by sheet, that are split into the groups.
+GROUPED_INTERMEDIATES = {
+    METRIC1_SHEET: ['enrolled', 'new_enrolled', 'referral_dates'],
+    METRIC4_SHEET: ['first_screening', 'sdoh_clients', 'sdoh_first', 'wellbeing'],
+    METRIC8_INTERACTION_SHEET: ['services_first', 'discharged'],
+}
+# - Metrics computed only from sheets without a client column; their group values are left empty.
+UNGROUPED_METRICS = ['Percent of identified client needs that were successfully met.']
+# - Group label for blank values, and for clients with no value at all (e.g. no outbound referrals).
+BLANK_GROUP = '(blank)'
+# - Group label used in every dimension column for the ungrouped total.
+TOTAL_GROUP = 'All'
+
+
+def calculate_grouped_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, dimensions: list, engine: str = DEFAULT_ENGINE, include_total: bool = True) -> pd.DataFrame:
+    """
+    Calculate all metrics for every group of the given dimensions (names from GROUP_DIMENSIONS, combined as a cross
+    product of the values that occur together).
+    Returns a tidy DataFrame with one row per group and metric: one column per dimension, then Metric, Value, Description.
+    With include_total, the ungrouped metrics come first, labelled TOTAL_GROUP in every dimension column, computed by
+    the given engine; the group values always come from the fused engine's intermediates (see above).
+    Raises ValueError when dimensions is empty or names an unknown dimension.
+    """
+    if not dimensions:
+        raise ValueError(f"At least one dimension from GROUP_DIMENSIONS is required: {list(GROUP_DIMENSIONS)}")
+    unknown = [name for name in dimensions if name not in GROUP_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group dimension(s): {unknown}. Choose from {list(GROUP_DIMENSIONS)}")
+    # Parse the date columns once, with one format cache; later parses pass parsed columns through
+    dfDict = parse_sheet_dates(dfDict, SHEET_DATE_COLUMNS)
+    tables = []
+    if include_total:
+        tables.append(calculate_all_metrics(dfDict, start_date, end_date, engine=engine).assign(**{name: TOTAL_GROUP for name in dimensions}))
+    for key, data in split_intermediates(dfDict, start_date, end_date, dimensions).items():
+        print(f"[DEBUG] Breakdown group {dict(zip(dimensions, key))}")
+        rows = iter_prepared_metrics(fused_engine, data, start_date, end_date, raise_errors=True)
+        table = pd.DataFrame([{col: row[col] for col in ('Metric', 'Value', 'Description')} for row in rows])
+        table.loc[table['Metric'].isin(UNGROUPED_METRICS), 'Value'] = np.nan
+        tables.append(table.assign(**dict(zip(dimensions, key))))
+    return pd.concat(tables, ignore_index=True)[list(dimensions) + ['Metric', 'Value', 'Description']]
+
+
+def split_intermediates(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, dimensions: list) -> dict:
+    """
+    Scan dfDict once with the fused engine and split its intermediates into the groups of the given dimensions.
+    Returns {group key (tuple of dimension values): intermediates in the form of fused_engine.prepare_data}, in sorted
+    key order. A group exists when any client of a sheet with a client column (GROUP_CLIENT_COLUMNS) falls into it.
+    """
+    memberships = {name: _client_values(dfDict, name) for name in dimensions}
+    scanned = fused_engine.prepare_data(dfDict, start_date, end_date)
+    clients = [client_hash(df[GROUP_CLIENT_COLUMNS[sheet]]) for sheet, df in dfDict.items() if GROUP_CLIENT_COLUMNS.get(sheet) in df.columns]
+    keys = list(_group_positions(np.unique(np.concatenate(clients)) if clients else np.array([], dtype='uint64'), memberships, dimensions))
+    groups = {key: {sheet: dict(value) if isinstance(value, dict) else value for sheet, value in scanned.items()} for key in keys}
+    # Per-client intermediates: each group gets the entries of its own clients
+    for sheet, fields in GROUPED_INTERMEDIATES.items():
+        for field in fields:
+            values = scanned[sheet][field] if isinstance(scanned.get(sheet), dict) else None
+            if values is None:
+                continue
+            ids = pd.Series(values, dtype=object) if isinstance(values, list) else pd.Series(values if isinstance(values, pd.Index) else values.index)
+            positions = _group_positions(client_hash(ids), memberships, dimensions)
+            for key in keys:
+                groups[key][sheet][field] = _take(values, positions.get(key, []))
+    # Row-level metrics (#1, #2 and #7) count each group's own rows
+    if isinstance(scanned.get(METRIC1_SHEET), dict):
+        for key in keys:
+            groups[key][METRIC1_SHEET].update(inbound_referrals=0, unique_referred=0)
+        client_df = dfDict[METRIC1_SHEET]
+        if METRIC2_CLIENTID_COL in client_df.columns:
+            hashes = client_hash(client_df[METRIC2_CLIENTID_COL])
+            mask = fused_engine.inbound_referral_rows(client_df, start_date, end_date)
+            if mask is not None:
+                for key, selected in _group_positions(hashes[mask.to_numpy()], memberships, dimensions).items():
+                    groups[key][METRIC1_SHEET]['inbound_referrals'] = len(selected)
+            mask = fused_engine.referred_rows(client_df, start_date, end_date)
+            if mask is not None:
+                referred = client_df.loc[mask, METRIC2_CLIENTID_COL]
+                for key, selected in _group_positions(hashes[mask.to_numpy()], memberships, dimensions).items():
+                    groups[key][METRIC1_SHEET]['unique_referred'] = referred.iloc[selected].nunique()
+    if isinstance(scanned.get(METRIC7_SHEET), dict):
+        for key in keys:
+            groups[key][METRIC7_SHEET] = {'outbound_referrals': {}}
+        referral_df = dfDict[METRIC7_SHEET]
+        mask = fused_engine.outbound_referral_rows(referral_df, start_date, end_date)
+        if mask is not None:
+            rows = referral_df[mask]
+            taxonomy = rows[METRIC7_TAXONOMY_COL]
+            category = taxonomy.astype(str).str.strip().where(fused_engine._not_blank(taxonomy), 'Uncategorized')
+            row_labels = {name: _labels(rows[spec['column']]).to_numpy() for name, spec in GROUP_DIMENSIONS.items() if spec['per_row'] and spec['sheet'] == METRIC7_SHEET}
+            for key, selected in _group_positions(client_hash(rows[METRIC7_CLIENTID_COL]), memberships, dimensions, row_labels).items():
+                counts = category.iloc[selected].value_counts(sort=False)
+                groups[key][METRIC7_SHEET] = {'outbound_referrals': {name: int(count) for name, count in counts.items()}}
+    return {key: groups[key] for key in sorted(groups)}
+
+
+def _group_positions(clients: np.ndarray, memberships: dict, dimensions: list, row_labels: dict | None = None) -> dict:
+    """
+    Group entries by the groups of their clients (client hashes, one per entry).
+    row_labels gives the values of row-level dimensions that belong to the entries themselves (e.g. the taxonomy of
+    each referral row); every other dimension takes its values from memberships, and an entry is in every group of its client.
+    Returns {group key: sorted positions of the entries in that group}.
+    """
+    keys = pd.DataFrame({'_row': np.arange(len(clients)), '_client': clients})
+    for name in dimensions:
+        if row_labels and name in row_labels:
+            keys[name] = row_labels[name]
+        else:
+            keys = keys.merge(memberships[name], on='_client', how='left')
+            keys[name] = keys[name].fillna(BLANK_GROUP)
+    return {key: np.sort(part['_row'].to_numpy()) for key, part in keys.groupby(list(dimensions), sort=True)}
+
+
+def _take(values, positions):
+    """
+    The entries of a per-client intermediate (list, Index, Series or DataFrame) at the given positions.
+    """
+    if isinstance(values, list):
+        return [values[i] for i in positions]
+    positions = np.asarray(positions, dtype='int64')
+    return values[positions] if isinstance(values, pd.Index) else values.iloc[positions]
+
+
+def _client_values(dfDict: dict, name: str) -> pd.DataFrame:
+    """
+    Returns the (client hash, value) pairs of a dimension: one per client for client-level dimensions
+    (the value on the client's last row), every distinct pair for row-level ones.
+    """
+    spec = GROUP_DIMENSIONS[name]
+    df = dfDict.get(spec['sheet'])
+    if df is None or spec['column'] not in df.columns or spec['client_column'] not in df.columns:
+        raise ValueError(f"Group dimension '{name}' needs columns {spec['client_column']} and {spec['column']} in sheet '{spec['sheet']}'.")
+    pairs = pd.DataFrame({'_client': client_hash(df[spec['client_column']]), name: _labels(df[spec['column']]).to_numpy()})
+    if spec['per_row']:
+        return pairs.drop_duplicates()
+    return pairs.drop_duplicates(subset='_client', keep='last')
+
+
+def _labels(values: pd.Series) -> pd.Series:
+    """
+    Dimension values as group labels: stripped text, with blanks and nulls as BLANK_GROUP.
+    """
+    labels = values.astype(object).where(values.notna(), '').astype(str).str.strip()
+    return labels.mask(labels == '', BLANK_GROUP)
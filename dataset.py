@@ -0,0 +1,332 @@
+import html
+import json
+import os
+import re
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from dates import parse_dates
+from metrics import (
+    METRIC_DEPENDENCIES,
+    METRIC_REQUIRED_COLUMNS,
+    RELEVANT_SHEETS,
+    SERVICES_PROVIDED,
+    normalize_client_ids,
+    normalize_mixed_columns,
+    METRIC7_SHEET,
+    METRIC7_REFERRAL_DATE_COL,
+    METRIC8_CLIENTID_COL,
+    METRIC8_INTERACTION_SHEET,
+    METRIC8_INTERACTION_DATE_COL,
+    METRIC8_OUTCOME_COL,
+)
+
+# Settings
+# - Sheets that are split into monthly partitions, keyed by the date column used to assign each row to a month.
+#   Every metric that reads these sheets only looks at rows whose date falls inside the report range, except for
+#   the #8/#9 lookback which is stored separately (see INTERACTION_LOOKBACK_NAME).
+PARTITIONED_SHEETS = {
+    METRIC8_INTERACTION_SHEET: METRIC8_INTERACTION_DATE_COL,
+    METRIC7_SHEET: METRIC7_REFERRAL_DATE_COL,
+    'Goalshortterm': 'GoalshorttermSystem_StgDateCreated',
+}
+# - Partition name for rows whose date could not be parsed; these rows never fall inside a date range.
+UNKNOWN_PARTITION = 'unknown'
+# - Name of the client-level lookback table for Metric #8 and #9.
+#   Holds the earliest SERVICES_PROVIDED interaction per client, since #8/#9 accept any interaction up to
+#   7/30 days after referral no matter how long ago it happened.
+INTERACTION_LOOKBACK_NAME = 'Interaction_services_first'
+# - Manifest file written at the root of a compiled dataset.
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+# - XML namespaces of the parts of an .xlsx file read by the header check.
+XLSX_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+# - Text runs (<t>) of a shared string entry, matched on the raw XML bytes.
+XLSX_TEXT = re.compile(rb'<t(?:\s[^>]*)?>(.*?)</t>', re.S)
+# - Phonetic runs (<rPh>) of a shared string entry: reading hints (e.g. furigana) with their own <t>, which are not
+#   part of the cell text and are removed before the text runs are joined.
+XLSX_PHONETIC = re.compile(rb'<rPh(?:\s[^>]*)?>.*?</rPh>', re.S)
+
+
+def read_excel_export(path: str) -> dict:
+    """
+    Read all relevant sheets of an Excel export into a dictionary of DataFrames.
+    Skips metadata row 2 so the first row is the header and data starts at row 3.
+    """
+    all_sheets = pd.read_excel(path, engine="openpyxl", header=0, skiprows=[1], sheet_name=None)
+    return {name: normalize_client_ids(all_sheets[name]) for name in RELEVANT_SHEETS if name in all_sheets}
+
+
+# Pre-flight schema check
+# Reads only the header row of each relevant sheet (or only the parquet schemas of a compiled dataset) and checks it
+# against the columns the selected metrics read (metrics.METRIC_REQUIRED_COLUMNS), so a missing or renamed column is
+# reported in well under a second instead of after the full load, as a report full of zeros.
+def read_headers(path: str) -> dict:
+    """
+    Returns {sheet name: [column names]} for the RELEVANT_SHEETS present in an Excel export or compiled dataset,
+    without reading any data rows.
+    """
+    if is_dataset(path):
+        manifest = read_manifest(path)
+        headers = {}
+        for name, info in manifest['sheets'].items():
+            if info['partition_col'] and not info['partitions']:
+                headers[name] = []
+                continue
+            file = os.path.join(path, name, f"{info['partitions'][0]}.parquet") if info['partition_col'] else os.path.join(path, f'{name}.parquet')
+            headers[name] = [col for col in pq.read_schema(file).names if not col.startswith('__index_level_')]
+        return headers
+    return read_xlsx_headers(path)
+
+
+def read_xlsx_headers(path: str) -> dict:
+    """
+    Returns {sheet name: [column names]} for the RELEVANT_SHEETS of an .xlsx file, reading only the first row of each.
+    Parses the workbook XML directly: each sheet is streamed only up to the end of its first row, and only the shared
+    strings the headers use are decoded. openpyxl, even in read-only mode, loads every shared
+    string of the workbook before returning a single cell, which takes seconds on a large export.
+    """
+    with zipfile.ZipFile(path) as xlsx:
+        workbook = ElementTree.fromstring(xlsx.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(xlsx.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): _xlsx_part(rel.get('Target')) for rel in rels.iter(f'{XLSX_PACKAGE_REL_NS}Relationship')}
+        shared_strings_part = next((_xlsx_part(rel.get('Target')) for rel in rels.iter(f'{XLSX_PACKAGE_REL_NS}Relationship') if rel.get('Type', '').endswith('/sharedStrings')), None)
+        sheet_parts = {sheet.get('name'): targets[sheet.get(f'{XLSX_REL_NS}id')] for sheet in workbook.iter(f'{XLSX_MAIN_NS}sheet')}
+        first_rows = {name: _first_row_cells(xlsx, sheet_parts[name]) for name in RELEVANT_SHEETS if name in sheet_parts}
+        needed = {int(value) for cells in first_rows.values() for kind, value in cells if kind == 's' and value is not None}
+        shared_strings = _shared_strings(xlsx, shared_strings_part, needed) if needed and shared_strings_part else {}
+    headers = {}
+    for name, cells in first_rows.items():
+        values = [shared_strings.get(int(value)) if kind == 's' and value is not None else value for kind, value in cells]
+        headers[name] = [value for value in values if value is not None and value != '']
+    return headers
+
+
+def _xlsx_part(target: str) -> str:
+    # Relationship targets are relative to xl/, or absolute from the package root
+    return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+
+def _first_row_cells(xlsx: zipfile.ZipFile, part: str) -> list:
+    """
+    Returns [(cell type, raw value)] of row 1 of a worksheet part; cell type 's' means the value is a shared string index.
+    """
+    with xlsx.open(part) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag != f'{XLSX_MAIN_NS}row':
+                continue
+            if element.get('r', '1') != '1':
+                return []
+            cells = []
+            for cell in element.iter(f'{XLSX_MAIN_NS}c'):
+                kind = cell.get('t', 'n')
+                if kind == 'inlineStr':
+                    # The text is either one <t> or a <t> per rich text run (<r>); phonetic runs (<rPh>) are skipped
+                    runs = cell.findall(f'{XLSX_MAIN_NS}is/{XLSX_MAIN_NS}t') + cell.findall(f'{XLSX_MAIN_NS}is/{XLSX_MAIN_NS}r/{XLSX_MAIN_NS}t')
+                    cells.append(('str', ''.join(t.text or '' for t in runs)))
+                else:
+                    value = cell.find(f'{XLSX_MAIN_NS}v')
+                    cells.append((kind, _xlsx_number(value.text) if kind == 'n' and value is not None else (value.text if value is not None else None)))
+            return cells
+    return []
+
+
+def _xlsx_number(text: str) -> str:
+    # A numeric header cell, written as openpyxl would give it back (5, not 5.0)
+    number = float(text)
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def _shared_strings(xlsx: zipfile.ZipFile, part: str, indices: set) -> dict:
+    """
+    Returns {index: text} of the given shared strings. The table is only split into entries up to the last index
+    needed, and only the needed entries are decoded.
+    """
+    data = xlsx.read(part)
+    if b'<si/>' in data:
+        data = data.replace(b'<si/>', b'<si></si>')
+    # Piece i holds everything up to the end of entry i; the last piece is the rest of the table
+    pieces = data.split(b'</si>', max(indices) + 1)
+    strings = {}
+    for index in indices:
+        if index < len(pieces) - 1:
+            entry = XLSX_PHONETIC.sub(b'', pieces[index].rpartition(b'<si')[2])
+            strings[index] = html.unescape(b''.join(XLSX_TEXT.findall(entry)).decode('utf-8'))
+    return strings
+
+
+def required_columns(metric_numbers: list = None) -> dict:
+    """
+    Returns {sheet name: [column names]} needed by the given metric numbers (default: all metrics),
+    including the columns of the metrics they are computed from.
+    """
+    pending = list(metric_numbers) if metric_numbers is not None else list(range(1, 17))
+    seen = set()
+    required = {}
+    while pending:
+        number = pending.pop()
+        if number in seen:
+            continue
+        seen.add(number)
+        pending.extend(METRIC_DEPENDENCIES.get(number, []))
+        for sheet, cols in METRIC_REQUIRED_COLUMNS.get(number, {}).items():
+            required.setdefault(sheet, [])
+            required[sheet].extend(col for col in cols if col not in required[sheet])
+    return required
+
+
+def validate_schema(headers: dict, metric_numbers: list = None) -> list:
+    """
+    Check sheet headers (as returned by read_headers) against the columns the given metrics need.
+    Returns a list of human-readable problems; an empty list means the schema is complete.
+    """
+    problems = []
+    for sheet, cols in required_columns(metric_numbers).items():
+        if sheet not in headers:
+            problems.append(f"Sheet '{sheet}' is missing.")
+            continue
+        missing = [col for col in cols if col not in headers[sheet]]
+        if missing:
+            problems.append(f"Sheet '{sheet}' is missing column(s): {', '.join(missing)}")
+    return problems
+
+
+def validate_export(path: str, metric_numbers: list = None, strict: bool = False) -> list:
+    """
+    Pre-flight check of an Excel export or compiled dataset before the expensive load.
+    Returns the list of problems found (see validate_schema). With strict=True, raises ValueError instead if there are any.
+    """
+    problems = validate_schema(read_headers(path), metric_numbers)
+    if problems and strict:
+        raise ValueError("Input is missing required columns:\n" + "\n".join(problems))
+    return problems
+
+
+# Compile step
+# Converts an export (dictionary of sheet DataFrames) into an on-disk dataset:
+# <dataset>/
+#   manifest.json
+#   Client.parquet, Ahpscreening.parquet, Ahpdischarge.parquet   (unpartitioned, always read in full)
+#   Interaction/2023-01.parquet, Interaction/2023-02.parquet, ... Interaction/unknown.parquet
+#   Interaction_referral/<month>.parquet, Goalshortterm/<month>.parquet
+#   Interaction_services_first.parquet                            (lookback for #8/#9)
+# The partition date column is stored already parsed, exactly as the metric functions would parse it.
+def compile_dataset(dfDict: dict, dataset_path: str) -> dict:
+    """
+    Write the sheets in dfDict to dataset_path as a month-partitioned dataset.
+    Sheets listed in PARTITIONED_SHEETS are split by the month of their date column; all other sheets are written whole.
+    Returns the manifest that was written.
+    """
+    os.makedirs(dataset_path, exist_ok=True)
+    manifest = {'version': MANIFEST_VERSION, 'sheets': {}, 'lookback': None}
+    # One date format cache for the whole export
+    formats = {}
+    for name, df in dfDict.items():
+        date_col = PARTITIONED_SHEETS.get(name)
+        if date_col is None or date_col not in df.columns:
+            _write_frame(df, os.path.join(dataset_path, f'{name}.parquet'))
+            manifest['sheets'][name] = {'partition_col': None, 'partitions': []}
+            continue
+        df = df.copy()
+        df[date_col] = parse_dates(df[date_col], formats=formats)
+        months = df[date_col].dt.strftime('%Y-%m').fillna(UNKNOWN_PARTITION)
+        sheet_dir = os.path.join(dataset_path, name)
+        os.makedirs(sheet_dir, exist_ok=True)
+        partitions = []
+        for month, part in df.groupby(months, sort=True):
+            _write_frame(part, os.path.join(sheet_dir, f'{month}.parquet'))
+            partitions.append(month)
+        manifest['sheets'][name] = {'partition_col': date_col, 'partitions': partitions}
+    if METRIC8_INTERACTION_SHEET in dfDict:
+        lookback = build_interaction_lookback(dfDict[METRIC8_INTERACTION_SHEET], formats=formats)
+        _write_frame(lookback, os.path.join(dataset_path, f'{INTERACTION_LOOKBACK_NAME}.parquet'))
+        manifest['lookback'] = INTERACTION_LOOKBACK_NAME
+    with open(os.path.join(dataset_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_interaction_lookback(interaction_df: pd.DataFrame, formats: dict | None = None) -> pd.DataFrame:
+    """
+    Returns the earliest SERVICES_PROVIDED interaction row per client (Client_Id, outcome, Interaction_CreateStamp).
+    formats is the date format cache of the export (see dates.parse_dates).
+    Metric #8 and #9 only need to know whether *some* qualifying interaction happened within N days of referral,
+    which holds exactly when the earliest one did, so this table is enough to answer them for any date range.
+    """
+    cols = [METRIC8_CLIENTID_COL, METRIC8_OUTCOME_COL, METRIC8_INTERACTION_DATE_COL]
+    if any(col not in interaction_df.columns for col in cols):
+        return pd.DataFrame(columns=cols)
+    df = interaction_df[cols].copy()
+    df[METRIC8_INTERACTION_DATE_COL] = parse_dates(df[METRIC8_INTERACTION_DATE_COL], formats=formats)
+    df = df[df[METRIC8_OUTCOME_COL].isin(SERVICES_PROVIDED) & df[METRIC8_INTERACTION_DATE_COL].notnull()]
+    df = df.sort_values([METRIC8_CLIENTID_COL, METRIC8_INTERACTION_DATE_COL])
+    return df.drop_duplicates(subset=[METRIC8_CLIENTID_COL], keep='first').reset_index(drop=True)
+
+
+# Load step
+# Reads a compiled dataset back into the dictionary shape expected by calculate_all_metrics, reading only the
+# partitions whose month overlaps [start_date, end_date]. The Interaction sheet additionally gets the lookback rows
+# appended so #8/#9 match a full-history run; those rows carry a SERVICES_PROVIDED outcome, so they can never be
+# picked up by get_discharged_clients.
+def load_dataset(dataset_path: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Load a dataset written by compile_dataset, pruning partitions outside [start_date, end_date].
+    Returns a dictionary of DataFrames keyed by sheet name.
+    """
+    manifest = read_manifest(dataset_path)
+    dfDict = {}
+    for name, info in manifest['sheets'].items():
+        if not info['partition_col']:
+            dfDict[name] = pd.read_parquet(os.path.join(dataset_path, f'{name}.parquet'))
+            continue
+        months = select_partitions(info['partitions'], start_date, end_date)
+        parts = [pd.read_parquet(os.path.join(dataset_path, name, f'{month}.parquet')) for month in months]
+        if not parts and info['partitions']:
+            # No month overlaps the range; keep the columns so the metric functions still see the schema.
+            parts = [pd.read_parquet(os.path.join(dataset_path, name, f"{info['partitions'][0]}.parquet")).iloc[0:0]]
+        # Partitions keep the original row labels, so sorting on them restores the export's row order
+        # (Metric #7 lists categories in the order they are first seen).
+        dfDict[name] = pd.concat(parts).sort_index().reset_index(drop=True) if parts else pd.DataFrame()
+    if manifest.get('lookback') and METRIC8_INTERACTION_SHEET in dfDict:
+        lookback = pd.read_parquet(os.path.join(dataset_path, f"{manifest['lookback']}.parquet"))
+        dfDict[METRIC8_INTERACTION_SHEET] = pd.concat([dfDict[METRIC8_INTERACTION_SHEET], lookback], ignore_index=True)
+    return dfDict
+
+
+def read_manifest(dataset_path: str) -> dict:
+    """
+    Read and validate the manifest of a compiled dataset.
+    Raises ValueError if dataset_path is not a compiled dataset or was written by an incompatible version.
+    """
+    manifest_path = os.path.join(dataset_path, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        raise ValueError(f"{dataset_path} is not a compiled dataset (missing {MANIFEST_FILE}).")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported dataset version {manifest.get('version')}; recompile the export.")
+    return manifest
+
+
+def select_partitions(partitions: list, start_date: pd.Timestamp, end_date: pd.Timestamp) -> list:
+    """
+    Returns the month partitions ('YYYY-MM') that overlap [start_date, end_date].
+    The unknown partition is never selected because its rows have no parseable date.
+    """
+    start_month = start_date.strftime('%Y-%m')
+    end_month = end_date.strftime('%Y-%m')
+    return [month for month in partitions if month != UNKNOWN_PARTITION and start_month <= month <= end_month]
+
+
+def is_dataset(path: str) -> bool:
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def _write_frame(df: pd.DataFrame, path: str) -> None:
+    normalize_mixed_columns(df).to_parquet(path)
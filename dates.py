@@ -0,0 +1,122 @@
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+# Format-aware date parsing for the export's date columns.
+# pd.to_datetime without a format guesses the format from the first value, and values written differently either
+# fall back to slow per-element parsing or are silently coerced to NaT. Instead, parse_dates infers the concrete
+# format of each column once from a sample of its values, caches it by column name, and parses the whole column
+# with that format (the vectorized fast path). Values that do not match the format ("outliers") get one more
+# vectorized pass with their own inferred format, only what is left is parsed one by one, and the number of values
+# that could not be parsed at all is recorded per column.
+
+# Settings
+# - Candidate formats, tried in order on a column sample; the one that parses the most sampled values wins.
+#   'ISO8601' is pandas' fast parser for any ISO 8601 variant (2023-01-05, 2023-01-05 10:32:00, 2023-01-05T10:32Z).
+DATE_FORMATS = [
+    'ISO8601',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %I:%M %p',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%m/%d/%y',
+    '%d-%b-%Y',
+    '%b %d, %Y',
+]
+# - Number of non-blank text values sampled to infer a column's format.
+DATE_SAMPLE_SIZE = 200
+# - If more than this share of a column's values do not match its cached format, the format is inferred again
+#   (e.g. two sheets of the same load with a column of the same name written differently).
+DATE_REINFER_SHARE = 0.5
+
+
+def infer_date_format(values: pd.Series) -> str | None:
+    """
+    Returns the DATE_FORMATS entry that parses the most values of a sample of the column's text values,
+    or None if the column has no text values or none of the formats match.
+    """
+    present = values.dropna()
+    sample = present.sample(min(len(present), DATE_SAMPLE_SIZE), random_state=0)
+    sample = pd.Series([value.strip() for value in sample if isinstance(value, str)], dtype=object)
+    sample = sample[sample != '']
+    if sample.empty:
+        return None
+    best_format, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+def parse_dates(values: pd.Series, column: str | None = None, formats: dict | None = None, failures: dict | None = None) -> pd.Series:
+    """
+    Parse a date column like pd.to_datetime(values, errors='coerce'), inferring its format once per cache.
+    formats is the cache, {column name: inferred format (None: pandas' own inference)}, shared by the parses of one
+    load or prepare_data call; without it the format is inferred from these values alone. column names the cache
+    entry (default: the Series name). Columns that are already datetime are returned as is.
+    Values that could not be parsed become NaT; their number is printed and, if failures is given, stored in it by column.
+    """
+    if is_datetime64_any_dtype(values.dtype):
+        # Arrow-backed timestamps (shared_dataset) become numpy datetimes, as pd.to_datetime would make them
+        return pd.to_datetime(values) if isinstance(values.dtype, pd.ArrowDtype) else values
+    column = values.name if column is None else column
+    formats = {} if formats is None else formats
+    if column not in formats:
+        formats[column] = infer_date_format(values)
+    parsed = _parse_with_format(values, formats[column])
+    outliers = _unparsed(values, parsed)
+    if outliers.sum() > DATE_REINFER_SHARE * values.notna().sum():
+        date_format = infer_date_format(values)
+        if date_format != formats[column]:
+            print(f"[DEBUG] Date column {column}: format changed from {formats[column]} to {date_format}")
+            formats[column] = date_format
+            parsed = _parse_with_format(values, date_format)
+            outliers = _unparsed(values, parsed)
+    if outliers.any():
+        # Outliers often share a second format of their own (rows entered by a different system): parse those with it
+        # too, and only what is left one by one
+        rest = values[outliers]
+        second_format = infer_date_format(rest)
+        fallback = _parse_with_format(rest, second_format) if second_format else pd.Series(pd.NaT, index=rest.index)
+        unmatched = _unparsed(rest, fallback)
+        if unmatched.any():
+            fallback = pd.concat([fallback[~unmatched], pd.to_datetime(rest[unmatched], format='mixed', errors='coerce')])
+        parsed = pd.concat([parsed[~outliers], fallback]).reindex(values.index)
+    unparsed = int(_unparsed(values, parsed).sum())
+    if failures is not None:
+        failures[column] = unparsed
+    if unparsed:
+        print(f"[DEBUG] Date column {column}: {unparsed} value(s) could not be parsed")
+    return parsed
+
+
+def parse_sheet_dates(dfDict: dict, date_columns: dict, formats: dict | None = None, failures: dict | None = None) -> dict:
+    """
+    Returns dfDict with the date columns of each sheet ({sheet name: [column, ...]}, e.g. metrics.SHEET_DATE_COLUMNS)
+    parsed by parse_dates; columns that are already parsed are passed through. All sheets share one format cache,
+    a new one per call unless formats is given, so formats inferred for one export are never applied to another.
+    """
+    formats = {} if formats is None else formats
+    return {
+        name: df.assign(**{col: parse_dates(df[col], formats=formats, failures=failures) for col in date_columns.get(name, []) if col in df.columns})
+        for name, df in dfDict.items()
+    }
+
+
+def _parse_with_format(values: pd.Series, date_format: str | None) -> pd.Series:
+    if date_format is None:
+        return pd.to_datetime(values, errors='coerce')
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+
+def _unparsed(values: pd.Series, parsed: pd.Series) -> pd.Series:
+    """
+    Mask of values that are present (not null, not blank text) but were parsed to NaT.
+    """
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        missing[missing] = values[missing].astype(str).str.strip() != ''
+    return missing
@@ -0,0 +1,224 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import is_numeric_dtype
+
+import fused_engine
+from client_partitions import client_partition
+from dates import parse_sheet_dates
+from metrics import (
+    METRIC2_SHEET,
+    METRIC2_CLIENTID_COL,
+    METRIC7_SHEET,
+    METRIC7_CLIENTID_COL,
+    METRIC8_CLIENT_SHEET,
+    METRIC8_INTERACTION_SHEET,
+    METRIC8_AHPSCREENING_SHEET,
+    SHEET_DATE_COLUMNS,
+)
+
+# Per-client drill-down: for every client, whether they were counted by each metric and the dates and scores
+# behind it, so a surprising number can be traced back to client IDs.
+# Clients are processed in chunks of about DRILLDOWN_CHUNK_CLIENTS: every row is assigned to a chunk once by Client_Id hash,
+# the fused engine's per-sheet scans (fused_engine.py) are run on each chunk, and the chunk's rows are appended to a
+# parquet file as one row group. Only one chunk of rows and output is ever held in memory.
+# The drill-down always uses the fused engine, whatever engine the report used: it needs each metric's per-client
+# intermediates (enrolled lists, first screening scores, first service dates), and only the fused scans expose
+# them; the pandas and polars engines reduce each metric straight to its value. The fused engine is tested against
+# the pandas reference row for row (tests/test_engine_parity.py), so the drill-down agrees with either report.
+# Membership follows the metric definitions, with one exception: #4 and #16 treat a missing score as Struggling
+# unless no client in the report has that score at all; the drill-down applies the Struggling rule per client.
+
+# Settings
+# - Clients per chunk (and per parquet row group).
+DRILLDOWN_CHUNK_CLIENTS = 50_000
+# - Sheets split into chunks, and their client ID column; every other sheet is not read by the drill-down.
+DRILLDOWN_CLIENT_COLUMNS = {
+    METRIC2_SHEET: METRIC2_CLIENTID_COL,
+    METRIC8_AHPSCREENING_SHEET: METRIC2_CLIENTID_COL,
+    METRIC8_INTERACTION_SHEET: METRIC2_CLIENTID_COL,
+    METRIC7_SHEET: METRIC7_CLIENTID_COL,
+}
+# - Output columns; the metric each column belongs to is in its name.
+DRILLDOWN_SCHEMA = pa.schema([
+    ('Client_Id', pa.string()),
+    ('m1_inbound_referrals', pa.int64()),
+    ('m2_referred', pa.bool_()),
+    ('m3_enrolled', pa.bool_()),
+    ('m4_first_screening_CL1', pa.float64()),
+    ('m4_first_screening_CL2', pa.float64()),
+    ('m4_priority_population', pa.bool_()),
+    ('m5_first_sdoh_date', pa.timestamp('us')),
+    ('m5_sdoh_assessment', pa.bool_()),
+    ('m6_newly_enrolled', pa.bool_()),
+    ('m7_outbound_referrals', pa.int64()),
+    ('m8_referral_date', pa.timestamp('us')),
+    ('m8_first_service_date', pa.timestamp('us')),
+    ('m8_days_to_connection', pa.float64()),
+    ('m8_connected_7_days', pa.bool_()),
+    ('m9_connected_30_days', pa.bool_()),
+    ('m16_discharged', pa.bool_()),
+    ('m16_intake_CL1', pa.float64()),
+    ('m16_intake_CL2', pa.float64()),
+    ('m16_discharge_CL1', pa.float64()),
+    ('m16_discharge_CL2', pa.float64()),
+    ('m16_improved_wellbeing', pa.bool_()),
+])
+
+
+def write_client_drilldown(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, path: str, chunk_clients: int = DRILLDOWN_CHUNK_CLIENTS) -> int:
+    """
+    Write the per-client drill-down for the report range to a parquet file, one row group per chunk of clients.
+    Returns the number of clients written.
+    """
+    written = 0
+    with pq.ParquetWriter(path, DRILLDOWN_SCHEMA) as writer:
+        for chunk in iter_client_drilldown(dfDict, start_date, end_date, chunk_clients):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=DRILLDOWN_SCHEMA, preserve_index=False))
+            written += len(chunk)
+    print(f"[DEBUG] Drill-down: {written} clients written to {path}")
+    return written
+
+
+def iter_client_drilldown(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, chunk_clients: int = DRILLDOWN_CHUNK_CLIENTS):
+    """
+    Generator of drill-down DataFrames (columns as DRILLDOWN_SCHEMA), one per chunk of clients.
+    """
+    # Date columns are parsed once for all chunks, with one format cache
+    dfDict = parse_sheet_dates(dfDict, SHEET_DATE_COLUMNS)
+    client_df = dfDict[METRIC2_SHEET]
+    num_clients = client_df[METRIC2_CLIENTID_COL].nunique() if METRIC2_CLIENTID_COL in client_df.columns else 0
+    num_chunks = max(1, math.ceil(num_clients / chunk_clients))
+    # Assign every row to its chunk once, keeping only row positions ordered by chunk; chunk i of each sheet holds
+    # the rows of the same clients and is only taken out of the sheet when its turn comes
+    positions = {}
+    for name, col in DRILLDOWN_CLIENT_COLUMNS.items():
+        df = dfDict.get(name)
+        if df is not None and col in df.columns:
+            chunks = client_partition(df[col], num_chunks).to_numpy()
+            order = np.argsort(chunks, kind='stable')
+            positions[name] = (order, np.searchsorted(chunks[order], np.arange(num_chunks + 1)))
+    for number in range(num_chunks):
+        sheets = {name: dfDict[name].iloc[order[bounds[number]:bounds[number + 1]]] for name, (order, bounds) in positions.items()}
+        chunk = _chunk_drilldown(sheets, start_date, end_date)
+        if not chunk.empty:
+            yield chunk
+
+
+def _chunk_drilldown(sheets: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.DataFrame:
+    """
+    Drill-down rows for the clients in one chunk of sheets.
+    """
+    scanned = fused_engine.prepare_data(sheets, start_date, end_date)
+    client = scanned.get(METRIC8_CLIENT_SHEET, {})
+    ahpscreening = scanned.get(METRIC8_AHPSCREENING_SHEET, {})
+    interaction = scanned.get(METRIC8_INTERACTION_SHEET, {})
+    # Every client that appears in any sheet of the chunk
+    ids = pd.Index(pd.concat([_client_key(df[DRILLDOWN_CLIENT_COLUMNS[name]]) for name, df in sheets.items()]).dropna().unique())
+    out = pd.DataFrame(index=ids)
+    client_sheet = sheets.get(METRIC2_SHEET)
+    if client_sheet is not None:
+        mask = fused_engine.inbound_referral_rows(client_sheet, start_date, end_date)
+        out['m1_inbound_referrals'] = _count_by_client(client_sheet, METRIC2_CLIENTID_COL, mask, ids)
+        mask = fused_engine.referred_rows(client_sheet, start_date, end_date)
+        out['m2_referred'] = _count_by_client(client_sheet, METRIC2_CLIENTID_COL, mask, ids) > 0
+    referral_sheet = sheets.get(METRIC7_SHEET)
+    if referral_sheet is not None:
+        mask = fused_engine.outbound_referral_rows(referral_sheet, start_date, end_date)
+        out['m7_outbound_referrals'] = _count_by_client(referral_sheet, METRIC7_CLIENTID_COL, mask, ids)
+    out['m3_enrolled'] = ids.isin(_client_key(pd.Series(client.get('enrolled', []), dtype=object)))
+    out['m6_newly_enrolled'] = ids.isin(_client_key(pd.Series(client.get('new_enrolled', []), dtype=object)))
+    # #4: first valid screening scores
+    first = _by_client(ahpscreening.get('first_screening'))
+    if first is not None:
+        scores = first.reindex(ids)
+        out['m4_first_screening_CL1'] = scores['CL1_num']
+        out['m4_first_screening_CL2'] = scores['CL2_num']
+        rank = fused_engine._wellbeing_rank(scores['CL1_num'], scores['CL2_num'])
+        out['m4_priority_population'] = out['m3_enrolled'] & ids.isin(first.index) & (rank != fused_engine.WELLBEING_ORDER["Thriving"])
+    # #5 and #8/#9: SDOH assessment and first service dates
+    sdoh_first = _by_client(ahpscreening.get('sdoh_first'), ids)
+    if sdoh_first is not None:
+        out['m5_first_sdoh_date'] = sdoh_first
+    if ahpscreening.get('sdoh_clients') is not None:
+        out['m5_sdoh_assessment'] = out['m3_enrolled'] & ids.isin(_client_key(pd.Series(ahpscreening['sdoh_clients'], dtype=object)))
+    referral_dates = _by_client(client.get('referral_dates'), ids)
+    if referral_dates is not None:
+        out['m8_referral_date'] = referral_dates
+    services_first = _by_client(interaction.get('services_first'), ids)
+    if services_first is not None:
+        out['m8_first_service_date'] = services_first
+    new_enrolled = client.get('new_enrolled', [])
+    if new_enrolled:
+        days = fused_engine.calculate_days_to_connection(client, interaction, ahpscreening, new_enrolled)
+        out['m8_days_to_connection'] = _by_client(days, ids)
+        out['m8_connected_7_days'] = out['m8_days_to_connection'] <= 7
+        out['m9_connected_30_days'] = out['m8_days_to_connection'] <= 30
+    # #16: discharged clients and their intake/discharge scores
+    out['m16_discharged'] = ids.isin(_client_key(pd.Series(interaction.get('discharged', []), dtype=object)))
+    wellbeing = _by_client(ahpscreening.get('wellbeing'))
+    if wellbeing is not None:
+        scores = wellbeing.reindex(ids)
+        for stage in ['intake', 'discharge']:
+            out[f'm16_{stage}_CL1'] = scores[f'{stage}_CL1']
+            out[f'm16_{stage}_CL2'] = scores[f'{stage}_CL2']
+        intake = fused_engine._wellbeing_rank(scores['intake_CL1'], scores['intake_CL2'])
+        discharge = fused_engine._wellbeing_rank(scores['discharge_CL1'], scores['discharge_CL2'])
+        out['m16_improved_wellbeing'] = out['m16_discharged'] & ids.isin(wellbeing.index) & (discharge > intake)
+    out = out.reindex(columns=DRILLDOWN_SCHEMA.names[1:])
+    for field in DRILLDOWN_SCHEMA:
+        if field.name in out.columns and pa.types.is_boolean(field.type):
+            out[field.name] = out[field.name].fillna(False).astype(bool)
+        elif field.name in out.columns and pa.types.is_integer(field.type):
+            out[field.name] = out[field.name].fillna(0).astype('int64')
+        elif field.name in out.columns and pa.types.is_timestamp(field.type):
+            out[field.name] = pd.to_datetime(out[field.name]).astype('datetime64[us]')
+    return out.rename_axis('Client_Id').reset_index()
+
+
+def _client_key(ids: pd.Series) -> pd.Series:
+    """
+    Client IDs as text, so the same client matches across sheets: whole numbers are written without a
+    trailing '.0' (12 and 12.0 are both '12'). Missing IDs stay missing.
+    """
+    if is_numeric_dtype(ids):
+        numbers = ids.astype('float64')
+        whole = numbers.notna() & (numbers % 1 == 0)
+        text = numbers.astype(str).astype(object).where(numbers.notna(), None)
+        text[whole] = numbers[whole].astype('int64').astype(str)
+        return text
+    return ids.map(_id_text)
+
+
+def _id_text(value):
+    if pd.isnull(value):
+        return None
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _by_client(values, ids: pd.Index | None = None):
+    """
+    Re-key a per-client intermediate (Series or DataFrame indexed by client) to text IDs, aligned to ids when given.
+    Returns None when the intermediate is missing.
+    """
+    if values is None:
+        return None
+    values = values[values.index.notna()]
+    values = values.set_axis(pd.Index(_client_key(values.index.to_series()).to_numpy()))
+    values = values[~values.index.duplicated(keep='first')]
+    return values if ids is None else values.reindex(ids)
+
+
+def _count_by_client(df: pd.DataFrame, client_column: str, mask: pd.Series | None, ids: pd.Index) -> pd.Series:
+    """
+    Number of rows selected by mask per client, aligned to ids (0 for clients without any).
+    """
+    if mask is None:
+        return pd.Series(0, index=ids)
+    counts = _client_key(df.loc[mask, client_column]).value_counts()
+    return counts.reindex(ids, fill_value=0).astype('int64')
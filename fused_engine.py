@@ -0,0 +1,355 @@
+import pandas as pd
+
+from dates import parse_dates
+from metrics import (
+    ENROLLED_STATUSES,
+    SERVICES_PROVIDED,
+    METRIC1_SHEET, METRIC1_DATE_COL, METRIC1_REFERRALTYPE_COL,
+    METRIC2_DATE_COL, METRIC2_CLIENTID_COL, METRIC2_REFERRALTYPE_COL, METRIC2_DUPLICATE_COL, METRIC2_DUPLICATE_VALUE,
+    METRIC3_CLIENTID_COL, METRIC3_DATE_COL, METRIC3_STATUS_COL, METRIC3_EDITSTAMP_COL,
+    METRIC4_SHEET, METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL, METRIC4_CL1_COL, METRIC4_CL2_COL,
+    METRIC5_CLIENTID_COL, METRIC5_SDOH_DATE_COL,
+    METRIC6_CLIENTID_COL, METRIC6_STATUS_COL, METRIC6_STATUS_VALUES, METRIC6_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL,
+    METRIC7_SHEET, METRIC7_CLIENTID_COL, METRIC7_TAXONOMY_COL, METRIC7_REFERRAL_DATE_COL,
+    METRIC8_CLIENTID_COL, METRIC8_INTERACTION_SHEET, METRIC8_REFERRAL_DATE_COL, METRIC8_OUTCOME_COL,
+    METRIC8_INTERACTION_DATE_COL, METRIC8_SDOH_DATE_COL,
+    SHEET_DATE_COLUMNS,
+)
+
+# Fused implementation of the metric definitions in metrics.py.
+# The pandas metrics each take a whole sheet and re-read it: Client is filtered, parsed and sorted by #1, #2, #3, #6
+# and #8/#9, Ahpscreening by #4, #5, #8/#9 and #16, Interaction by #8/#9 and get_discharged_clients.
+# Here prepare_data runs a planner instead: for each sheet it collects the scans of every metric that reads it,
+# parses the sheet's columns once, and evaluates all of those scans against the one prepared frame. The result per
+# sheet is a dictionary of small intermediates (counts, per-client dates and scores, client lists), and the metric
+# functions below only look values up in it.
+# Within a scan, metrics reading the same rows share the work: masks are computed once per column (_memo), #3 and #6
+# use one sort of Client, and the Interaction intermediates come out of a single groupby.
+# metrics.py stays the reference implementation; any difference in output between the two is a bug in this module.
+
+# Settings
+# - Wellbeing category order used by #16: Suffering < Struggling < Thriving.
+WELLBEING_ORDER = {"Suffering": 0, "Struggling": 1, "Thriving": 2}
+
+
+def _has(df: pd.DataFrame, cols: list) -> bool:
+    return all(col in df.columns for col in cols)
+
+
+def _in_range(series: pd.Series, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.Series:
+    return (series >= start_date) & (series <= end_date)
+
+
+def _not_blank(series: pd.Series) -> pd.Series:
+    return series.notnull() & (series.astype(str).str.strip() != '')
+
+
+def _contains_any(series: pd.Series, values: list) -> pd.Series:
+    lowered = series.astype(str).str.lower()
+    mask = pd.Series(False, index=series.index)
+    for value in values:
+        mask |= lowered.str.contains(value.lower(), regex=False)
+    return mask
+
+
+def _first_digit(series: pd.Series) -> pd.Series:
+    # Vectorized extract_first_digit; a float column, as the pandas metrics end up with after .apply().
+    # Going through object keeps this working on arrow-backed columns too (see shared_dataset.attach_dataset).
+    text = series.astype(object)
+    digits = text.where(text.isnull(), text.astype(str)).str.extract(r'(\d+)', expand=False)
+    return pd.to_numeric(digits, errors='coerce').astype(float)
+
+
+def _memo(cache: dict | None, key: tuple, compute):
+    # Within one scan, masks and orderings that several metrics need are computed once and shared through cache.
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _not_blank_col(df: pd.DataFrame, col: str, cache: dict | None = None) -> pd.Series:
+    return _memo(cache, ('not_blank', col), lambda: _not_blank(df[col]))
+
+
+def _in_range_col(df: pd.DataFrame, col: str, start_date: pd.Timestamp, end_date: pd.Timestamp, cache: dict | None = None) -> pd.Series:
+    return _memo(cache, ('in_range', col), lambda: _in_range(df[col], start_date, end_date))
+
+
+def _sorted_by(df: pd.DataFrame, cols: list, cache: dict | None = None) -> pd.DataFrame:
+    # Stable ascending sort, NaT last: the order the pandas metrics sort client rows in
+    return _memo(cache, ('sorted', *cols), lambda: df.sort_values(cols, kind='stable'))
+
+
+def _wellbeing_rank(cl1: pd.Series, cl2: pd.Series) -> pd.Series:
+    # cantrils_ladder_category on float scores: a missing score is NaN, which fails every comparison and lands on Struggling.
+    rank = pd.Series(WELLBEING_ORDER["Struggling"], index=cl1.index)
+    rank[(cl1 <= 4) & (cl2 <= 4)] = WELLBEING_ORDER["Suffering"]
+    rank[(cl1 >= 7) & (cl2 >= 8)] = WELLBEING_ORDER["Thriving"]
+    return rank
+
+
+# Row selections
+# The rows counted by the row-level metrics (#1, #2 and #7), shared by the scans below and by the per-client
+# drill-down (drilldown.py). Each returns a boolean mask over the sheet, or None if the columns are missing.
+# Masks the selections have in common (the Client_CreateStamp range, the non-blank referral type) are computed once
+# when the caller passes a cache dictionary.
+def inbound_referral_rows(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp, cache: dict | None = None) -> pd.Series | None:
+    """
+    Client rows counted as inbound referrals by #1.
+    """
+    if METRIC1_REFERRALTYPE_COL not in df.columns:
+        return None
+    mask = _not_blank_col(df, METRIC1_REFERRALTYPE_COL, cache)
+    if METRIC1_DATE_COL in df.columns:
+        mask = mask & _in_range_col(df, METRIC1_DATE_COL, start_date, end_date, cache)
+    return mask
+
+
+def referred_rows(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp, cache: dict | None = None) -> pd.Series | None:
+    """
+    Client rows whose Client_Id is counted as a referred individual by #2.
+    """
+    missing = [col for col in [METRIC2_CLIENTID_COL, METRIC2_REFERRALTYPE_COL, METRIC2_DUPLICATE_COL] if col not in df.columns]
+    if missing:
+        print(f'[DEBUG] Required column missing for Metric #2: {missing[0]}')
+        return None
+    status = df[METRIC2_DUPLICATE_COL]
+    mask = _not_blank_col(df, METRIC2_REFERRALTYPE_COL, cache) & _not_blank_col(df, METRIC2_DUPLICATE_COL, cache) & (status.astype(str).str.strip() != METRIC2_DUPLICATE_VALUE)
+    if METRIC2_DATE_COL in df.columns:
+        mask &= _in_range_col(df, METRIC2_DATE_COL, start_date, end_date, cache)
+    return mask
+
+
+def outbound_referral_rows(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp, cache: dict | None = None) -> pd.Series | None:
+    """
+    Interaction_referral rows counted as outbound referrals by #7.
+    """
+    if not _has(df, [METRIC7_CLIENTID_COL, METRIC7_TAXONOMY_COL, METRIC7_REFERRAL_DATE_COL]):
+        return None
+    return _in_range_col(df, METRIC7_REFERRAL_DATE_COL, start_date, end_date, cache) & _not_blank_col(df, METRIC7_CLIENTID_COL, cache)
+
+
+# Per-sheet scans
+# Each scan receives the sheet with its date columns already parsed and returns every intermediate the metrics need
+# from that sheet. A value of None means the columns the metric requires are missing.
+def scan_client(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Client sheet: #1 and #2 counts, the #3 enrolled and #6 newly enrolled client lists,
+    and the referral date per client used by #8/#9.
+    #1 and #2 share their masks, and #3 and #6 read the earliest and the latest status off one sort of the sheet.
+    """
+    out = {'inbound_referrals': 0, 'unique_referred': 0, 'enrolled': [], 'new_enrolled': [], 'referral_dates': None}
+    cache = {}
+    mask = inbound_referral_rows(df, start_date, end_date, cache)
+    if mask is not None:
+        out['inbound_referrals'] = int(mask.sum())
+    mask = referred_rows(df, start_date, end_date, cache)
+    if mask is not None:
+        out['unique_referred'] = df.loc[mask, METRIC2_CLIENTID_COL].nunique()
+    if _has(df, [METRIC3_CLIENTID_COL, METRIC3_STATUS_COL, METRIC3_EDITSTAMP_COL]):
+        ordered = _sorted_by(df, [METRIC3_CLIENTID_COL, METRIC3_EDITSTAMP_COL], cache)
+        rows = ordered[ordered[METRIC3_DATE_COL] <= end_date] if METRIC3_DATE_COL in df.columns else ordered
+        earliest = rows.drop_duplicates(subset=[METRIC3_CLIENTID_COL], keep='first')
+        out['enrolled'] = earliest.loc[_contains_any(earliest[METRIC3_STATUS_COL], ENROLLED_STATUSES), METRIC3_CLIENTID_COL].unique().tolist()
+    if _has(df, [METRIC6_CLIENTID_COL, METRIC6_STATUS_COL, METRIC6_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL]):
+        ordered = _sorted_by(df, [METRIC6_CLIENTID_COL, METRIC6_EDITSTAMP_COL], cache)
+        rows = ordered[_in_range(ordered[METRIC6_OPTIN_DATE_COL], start_date, end_date)]
+        # The pandas metric sorts edit stamps descending (NaT still last) and keeps the first row per client: in the
+        # ascending order that is the first row holding the client's latest stamp, or its first row if it has none.
+        stamp = rows[METRIC6_EDITSTAMP_COL]
+        latest_stamp = stamp.groupby(rows[METRIC6_CLIENTID_COL], dropna=False, sort=False).transform('max')
+        latest = rows[(stamp == latest_stamp) | latest_stamp.isnull()].drop_duplicates(subset=[METRIC6_CLIENTID_COL], keep='first')
+        out['new_enrolled'] = latest.loc[_contains_any(latest[METRIC6_STATUS_COL], METRIC6_STATUS_VALUES), METRIC6_CLIENTID_COL].unique().tolist()
+    if _has(df, [METRIC8_CLIENTID_COL, METRIC8_REFERRAL_DATE_COL]):
+        # Last row per client wins, as with client_df.set_index(...).to_dict()
+        last = df.drop_duplicates(subset=[METRIC8_CLIENTID_COL], keep='last')
+        out['referral_dates'] = last.set_index(METRIC8_CLIENTID_COL)[METRIC8_REFERRAL_DATE_COL]
+    return out
+
+
+def scan_ahpscreening(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Ahpscreening sheet: the first valid screening scores per client (#4), clients with an SDOH assessment (#5),
+    the earliest SDOH assessment date per client (#8/#9) and the intake/discharge scores per client (#16).
+    """
+    out = {'first_screening': None, 'sdoh_clients': None, 'sdoh_first': None, 'wellbeing': None}
+    cl_valid = None
+    if _has(df, [METRIC4_CL1_COL, METRIC4_CL2_COL]):
+        cl_valid = _not_blank(df[METRIC4_CL1_COL]) & _not_blank(df[METRIC4_CL2_COL])
+        scored = df[cl_valid].assign(CL1_num=lambda d: _first_digit(d[METRIC4_CL1_COL]), CL2_num=lambda d: _first_digit(d[METRIC4_CL2_COL]))
+    if cl_valid is not None and _has(df, [METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL]):
+        first = scored.sort_values([METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL], kind='stable').drop_duplicates(subset=[METRIC4_CLIENTID_COL], keep='first')
+        out['first_screening'] = first.set_index(METRIC4_CLIENTID_COL)[['CL1_num', 'CL2_num']]
+    if _has(df, [METRIC8_CLIENTID_COL, METRIC8_SDOH_DATE_COL]):
+        out['sdoh_first'] = df.groupby(METRIC8_CLIENTID_COL)[METRIC8_SDOH_DATE_COL].min().dropna()
+    if _has(df, [METRIC5_CLIENTID_COL, METRIC5_SDOH_DATE_COL]):
+        if (METRIC5_CLIENTID_COL, METRIC5_SDOH_DATE_COL) == (METRIC8_CLIENTID_COL, METRIC8_SDOH_DATE_COL):
+            # Clients with any assessment date are exactly those with an earliest one
+            out['sdoh_clients'] = out['sdoh_first'].index
+        else:
+            assessed = df[df[METRIC5_SDOH_DATE_COL].notnull()]
+            out['sdoh_clients'] = pd.Index(assessed[METRIC5_CLIENTID_COL].dropna().unique())
+    if cl_valid is not None and _has(df, ['Client_Id', 'Ahpscreening_CreateStamp']):
+        ordered = scored.sort_values(['Client_Id', 'Ahpscreening_CreateStamp'], kind='stable')
+        intake = ordered.drop_duplicates(subset=['Client_Id'], keep='first').set_index('Client_Id')
+        discharge = ordered.drop_duplicates(subset=['Client_Id'], keep='last').set_index('Client_Id')
+        # Whether the client has any parseable score, needed to reproduce the "Unknown" category (see #16 below)
+        has_scores = ordered.groupby('Client_Id', dropna=False)[['CL1_num', 'CL2_num']].count() > 0
+        out['wellbeing'] = pd.DataFrame({
+            'intake_CL1': intake['CL1_num'], 'intake_CL2': intake['CL2_num'],
+            'discharge_CL1': discharge['CL1_num'], 'discharge_CL2': discharge['CL2_num'],
+            'has_CL1': has_scores['CL1_num'], 'has_CL2': has_scores['CL2_num'],
+        })
+    return out
+
+
+def scan_interaction(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Interaction sheet: the earliest SERVICES_PROVIDED interaction date per client (#8/#9)
+    and the clients discharged during the date range (#16), from one grouped pass over the sheet.
+    """
+    out = {'services_first': None, 'discharged': []}
+    if not _has(df, [METRIC8_CLIENTID_COL, METRIC8_OUTCOME_COL, METRIC8_INTERACTION_DATE_COL]):
+        return out
+    outcome = df[METRIC8_OUTCOME_COL]
+    dates = df[METRIC8_INTERACTION_DATE_COL]
+    discharged = outcome.astype(str).str.contains('discharged', case=False, na=False) & _in_range(dates, start_date, end_date)
+    per_client = pd.DataFrame({
+        'services_first': dates.where(outcome.isin(SERVICES_PROVIDED)),
+        'discharged': discharged,
+    }).groupby(df[METRIC8_CLIENTID_COL], sort=False).agg({'services_first': 'min', 'discharged': 'any'})
+    out['services_first'] = per_client['services_first'].dropna()
+    out['discharged'] = per_client.index[per_client['discharged']].tolist()
+    return out
+
+
+def scan_interaction_referral(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Interaction_referral sheet: outbound referral counts per HRSN category (#7), in order of first appearance.
+    """
+    mask = outbound_referral_rows(df, start_date, end_date)
+    if mask is None:
+        return {'outbound_referrals': {}}
+    taxonomy = df.loc[mask, METRIC7_TAXONOMY_COL]
+    category = taxonomy.astype(str).str.strip().where(_not_blank(taxonomy), 'Uncategorized')
+    counts = category.value_counts(sort=False)
+    return {'outbound_referrals': {name: int(count) for name, count in counts.items()}}
+
+
+def scan_goalshortterm(df: pd.DataFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Goalshortterm sheet: percent of goals created in the date range that were met (#15).
+    """
+    if not _has(df, ['Goalshortterm_Status', 'GoalshorttermOption_GoalClosureStatus', 'GoalshorttermSystem_StgDateCreated', 'GoalshorttermSystem_StgDateCompleted']):
+        print("[DEBUG] Required columns missing!")
+        return {'needs_met': 0.0}
+    rows = df[_in_range(df['GoalshorttermSystem_StgDateCreated'], start_date, end_date)]
+    if rows.empty:
+        return {'needs_met': 0.0}
+    met = _contains_any(rows['GoalshorttermOption_GoalClosureStatus'], ['Met', 'Partially Met'])
+    return {'needs_met': (int(met.sum()) / len(rows)) * 100}
+
+
+# The plan: every scan registered against the sheet it reads.
+SHEET_SCANS = {
+    METRIC1_SHEET: scan_client,
+    METRIC4_SHEET: scan_ahpscreening,
+    METRIC8_INTERACTION_SHEET: scan_interaction,
+    METRIC7_SHEET: scan_interaction_referral,
+    'Goalshortterm': scan_goalshortterm,
+}
+
+
+def prepare_data(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Run the plan: for each sheet with registered scans, parse its date columns once and evaluate its scan.
+    Returns a dictionary keyed by sheet name holding each sheet's intermediates; sheets no metric reads are left as is.
+    """
+    scanned = dict(dfDict)
+    # Date formats are inferred once per column for this call (see dates.parse_dates)
+    formats = {}
+    for name, scan in SHEET_SCANS.items():
+        if name not in dfDict:
+            continue
+        df = dfDict[name]
+        date_cols = [col for col in SHEET_DATE_COLUMNS.get(name, []) if col in df.columns]
+        if date_cols:
+            df = df.assign(**{col: parse_dates(df[col], formats=formats) for col in date_cols})
+        scanned[name] = scan(df, start_date, end_date)
+    return scanned
+
+
+# Metric functions
+# Same names and arguments as in metrics.py; the sheet arguments are the intermediates from prepare_data, which were
+# already computed for the report's date range.
+def calculate_inbound_referrals(client: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> int:
+    return client['inbound_referrals']
+
+
+def calculate_unique_individuals_referred(client: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> int:
+    return client['unique_referred']
+
+
+def calculate_enrolled_clients(client: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> tuple:
+    return len(client['enrolled']), client['enrolled']
+
+
+def calculate_enrolled_clients_priority_population(ahpscreening: dict, listOfEnrolledClients: list) -> int:
+    first = ahpscreening['first_screening']
+    if first is None:
+        return 0
+    first = first[first.index.isin(listOfEnrolledClients)]
+    # The pandas metric only reports "Unknown" (not priority) when no enrolled client has a parseable score at all.
+    if first.empty or first['CL1_num'].isnull().all() or first['CL2_num'].isnull().all():
+        return 0
+    rank = _wellbeing_rank(first['CL1_num'], first['CL2_num'])
+    return int((rank != WELLBEING_ORDER["Thriving"]).sum())
+
+
+def calculate_enrolled_clients_with_sdoh_assessment(ahpscreening: dict, listOfEnrolledClients: list) -> int:
+    if ahpscreening['sdoh_clients'] is None:
+        return 0
+    return int(ahpscreening['sdoh_clients'].isin(listOfEnrolledClients).sum())
+
+
+def calculate_new_enrolled_clients(client: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> tuple:
+    return len(client['new_enrolled']), client['new_enrolled']
+
+
+def calculate_outbound_referrals_type(interaction_referral: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    return interaction_referral['outbound_referrals']
+
+
+# Metric #8 and #9
+# A client's days-to-connection is measured from referral to their earliest qualifying interaction or SDOH assessment,
+# counted as (event - referral).days like #8/#9 and never negative (see metrics.calculate_days_to_connection);
+# #8/#9 themselves are read off its distribution by metrics.iter_metrics.
+def calculate_days_to_connection(client: dict, interaction: dict, ahpscreening: dict, newly_enrolled_client_ids: list) -> pd.Series:
+    ids = pd.Index(pd.unique(pd.Series(newly_enrolled_client_ids, dtype=object)))
+    first_events = [first_dates.reindex(ids) for first_dates in [interaction['services_first'], ahpscreening['sdoh_first']] if first_dates is not None]
+    if ids.empty or client['referral_dates'] is None or not first_events:
+        return pd.Series(float('nan'), index=ids)
+    return (pd.concat(first_events, axis=1).min(axis=1) - client['referral_dates'].reindex(ids)).dt.days.clip(lower=0)
+
+
+def calculate_identified_client_needs_met(goalshortterm: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> float:
+    return goalshortterm['needs_met']
+
+
+def get_discharged_clients(interaction: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> list:
+    return interaction['discharged']
+
+
+def calculate_discharged_clients_wellbeing_improvement(ahpscreening: dict, discharged_clients: list) -> float:
+    wellbeing = ahpscreening['wellbeing']
+    if not discharged_clients or wellbeing is None:
+        return 0.0
+    wellbeing = wellbeing[wellbeing.index.isin(discharged_clients)]
+    # As in #4: categories are only "Unknown" when none of these clients has a parseable score in that column.
+    if wellbeing.empty or not wellbeing['has_CL1'].any() or not wellbeing['has_CL2'].any():
+        return 0.0
+    intake = _wellbeing_rank(wellbeing['intake_CL1'], wellbeing['intake_CL2'])
+    discharge = _wellbeing_rank(wellbeing['discharge_CL1'], wellbeing['discharge_CL2'])
+    return ((discharge > intake).sum() / len(wellbeing)) * 100
@@ -5,7 +5,12 @@ import os
 from datetime import datetime
 
 # Placeholder for metric calculation logic
-from metrics import calculate_all_metrics, RELEVANT_SHEETS, DEFAULT_END_DATE, DEFAULT_START_DATE, DEFAULT_EXCEL_PATH, DEFAULT_OUTPUT_PATH
+from metrics import DEFAULT_END_DATE, DEFAULT_START_DATE, DEFAULT_EXCEL_PATH, DEFAULT_OUTPUT_PATH, DEFAULT_ENGINE, ENGINES, SHEET_DATE_COLUMNS
+from dates import parse_sheet_dates
+from preview import preview_metrics
+from report_stream import stream_report
+from drilldown import write_client_drilldown
+from dataset import read_excel_export, compile_dataset, load_dataset, is_dataset, validate_export, MANIFEST_FILE
 
 def select_input_file():
     file_path = filedialog.askopenfilename(
@@ -19,83 +24,180 @@ def select_output_file():
     file_path = filedialog.asksaveasfilename(
         title="Save CSV As",
         defaultextension=".csv",
-        filetypes=[("CSV Files", "*.csv")]
+        filetypes=[("CSV Files", "*.csv"), ("JSON Lines Files", "*.jsonl"), ("JSON Files", "*.json")]
     )
     output_entry.delete(0, tk.END)
     output_entry.insert(0, file_path)
 
+# File name suffix of the per-client drill-down written next to the report when "Client drill-down" is checked
+DRILLDOWN_SUFFIX = '_drilldown.parquet'
+
+# Sheets loaded by the last preview or report, keyed by input path, modification time and (for compiled datasets)
+# date range, so confirming a preview or re-running with the same input does not read the export again.
+# For a compiled dataset the modification time is the manifest's: a recompile rewrites the files inside the directory,
+# which leaves the directory's own time unchanged, and writes the manifest last.
+_loaded_input = {}
+
+def parse_date_range():
+    """
+    Returns (start, end) Timestamps from the date fields; a wide range if either is empty.
+    Raises ValueError for an invalid date.
+    """
+    start_date_str = start_date_entry.get()
+    end_date_str = end_date_entry.get()
+    # Parse date range if provided, but do not filter here
+    # Always provide valid pd.Timestamp for start/end date (use wide range if not provided)
+    if start_date_str and end_date_str:
+        try:
+            return pd.to_datetime(datetime.strptime(start_date_str, "%Y-%m-%d")), pd.to_datetime(datetime.strptime(end_date_str, "%Y-%m-%d"))
+        except Exception as e:
+            raise ValueError(f"Invalid date format: {e}")
+    return pd.Timestamp.min, pd.Timestamp.max
+
+def load_input(input_path, pd_start_date, pd_end_date):
+    """
+    Check and load the input export or compiled dataset. Returns the sheets, or None if the user cancelled.
+    """
+    if is_dataset(input_path):
+        key = (input_path, os.path.getmtime(os.path.join(input_path, MANIFEST_FILE)), pd_start_date, pd_end_date)
+    else:
+        key = (input_path, os.path.getmtime(input_path))
+    if key not in _loaded_input:
+        # Pre-flight: check the headers before the full load so a renamed column is caught in under a second
+        problems = validate_export(input_path)
+        if problems:
+            print("[DEBUG] Schema problems:\n" + "\n".join(problems))
+            if not messagebox.askyesno("Missing columns", "\n".join(problems) + "\n\nAffected metrics will be reported as 0. Continue anyway?"):
+                return None
+        if is_dataset(input_path):
+            # Compiled dataset: only the month partitions overlapping the date range are read
+            data = load_dataset(input_path, pd_start_date, pd_end_date)
+        else:
+            # Read all relevant sheets into a dictionary of DataFrames, skip metadata row 2 so first row is header and data starts at row 3
+            data = read_excel_export(input_path)
+        # Date formats are inferred once for this load and not reused for any other input
+        data = parse_sheet_dates(data, SHEET_DATE_COLUMNS)
+        _loaded_input.clear()
+        _loaded_input[key] = data
+    # Shallow copies, so the metric functions' column assignments stay out of the cache
+    return {name: df.copy(deep=False) for name, df in _loaded_input[key].items()}
+
 def run_report():
     input_path = input_entry.get()
     output_path = output_entry.get()
-    start_date_str = start_date_entry.get()
-    end_date_str = end_date_entry.get()
-    if not os.path.isfile(input_path):
+    if not os.path.isfile(input_path) and not is_dataset(input_path):
         messagebox.showerror("Error", "Input file does not exist.")
         return
     try:
-        # Read all relevant sheets into a dictionary of DataFrames, skip metadata row 2 so first row is header and data starts at row 3
-        sheet_names = RELEVANT_SHEETS
-        all_sheets = pd.read_excel(input_path, engine="openpyxl", header=0, skiprows=[1], sheet_name=None)
-        data = {name: all_sheets[name] for name in sheet_names if name in all_sheets}
-        # Parse date range if provided, but do not filter here
-        # Always provide valid pd.Timestamp for start/end date (use wide range if not provided)
-        if start_date_str and end_date_str:
-            try:
-                pd_start_date = pd.to_datetime(datetime.strptime(start_date_str, "%Y-%m-%d"))
-                pd_end_date = pd.to_datetime(datetime.strptime(end_date_str, "%Y-%m-%d"))
-            except Exception as e:
-                messagebox.showerror("Error", f"Invalid date format: {e}")
-                return
+        pd_start_date, pd_end_date = parse_date_range()
+        data = load_input(input_path, pd_start_date, pd_end_date)
+        if data is None:
+            return
+        # Rows are appended to the output as each metric finishes, so a failure keeps everything computed before it
+        rows = stream_report(data, pd_start_date, pd_end_date, output_path, engine=engine_var.get())
+        if drilldown_var.get():
+            # Per-client membership behind each metric, next to the report
+            write_client_drilldown(data, pd_start_date, pd_end_date, os.path.splitext(output_path)[0] + DRILLDOWN_SUFFIX)
+        failed = [f"{row['Metric']}: {row['Status']}" for row in rows if row['Status'] != 'ok']
+        if failed:
+            messagebox.showwarning("Partial report", f"Report saved to {output_path}, but some metrics could not be calculated:\n" + "\n".join(failed))
         else:
-            pd_start_date = pd.Timestamp.min
-            pd_end_date = pd.Timestamp.max
-        metrics_df = calculate_all_metrics(data, pd_start_date, pd_end_date)
-        metrics_df.to_csv(output_path, index=False)
-        messagebox.showinfo("Success", f"Report saved to {output_path}")
+            messagebox.showinfo("Success", f"Report saved to {output_path}")
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
-root = tk.Tk()
-root.title("CMS Metrics Reporting Tool by Advance")
-
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack()
-
-# Input file selection
-input_label = tk.Label(frame, text="Input Excel File:")
-input_label.grid(row=0, column=0, sticky="e")
-input_entry = tk.Entry(frame, width=40)
-input_entry.grid(row=0, column=1)
-input_button = tk.Button(frame, text="Browse", command=select_input_file)
-input_button.grid(row=0, column=2)
-
-# Output file selection
-output_label = tk.Label(frame, text="Output CSV File:")
-output_label.grid(row=1, column=0, sticky="e")
-output_entry = tk.Entry(frame, width=40)
-output_entry.grid(row=1, column=1)
-output_button = tk.Button(frame, text="Browse", command=select_output_file)
-output_button.grid(row=1, column=2)
-
-# Date range selection
-start_date_label = tk.Label(frame, text="Start Date (YYYY-MM-DD):")
-start_date_label.grid(row=2, column=0, sticky="e")
-start_date_entry = tk.Entry(frame, width=20)
-start_date_entry.grid(row=2, column=1, sticky="w")
-
-end_date_label = tk.Label(frame, text="End Date (YYYY-MM-DD):")
-end_date_label.grid(row=3, column=0, sticky="e")
-end_date_entry = tk.Entry(frame, width=20)
-end_date_entry.grid(row=3, column=1, sticky="w")
-
-# Run button
-run_button = tk.Button(frame, text="Generate Report", command=run_report, width=20)
-run_button.grid(row=4, column=0, columnspan=3, pady=10)
-
-# Prefill fields for testing
-input_entry.insert(0, DEFAULT_EXCEL_PATH)
-output_entry.insert(0, DEFAULT_OUTPUT_PATH)
-start_date_entry.insert(0, DEFAULT_START_DATE)
-end_date_entry.insert(0, DEFAULT_END_DATE)
-
-root.mainloop()
+def preview_report():
+    input_path = input_entry.get()
+    if not os.path.isfile(input_path) and not is_dataset(input_path):
+        messagebox.showerror("Error", "Input file does not exist.")
+        return
+    try:
+        pd_start_date, pd_end_date = parse_date_range()
+        data = load_input(input_path, pd_start_date, pd_end_date)
+        if data is None:
+            return
+        preview_df = preview_metrics(data, pd_start_date, pd_end_date, engine=engine_var.get())
+        lines = [f"{row.Metric}: {row.Value:.1f} ({row.Lower:.1f} to {row.Upper:.1f})" for row in preview_df.itertuples()]
+        title = "Preview (approximate)" if preview_df['Approximate'].any() else "Preview (exact)"
+        if messagebox.askyesno(title, "\n".join(lines) + "\n\nRun the exact full report now?"):
+            run_report()
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+
+def compile_input_dataset():
+    input_path = input_entry.get()
+    if not os.path.isfile(input_path):
+        messagebox.showerror("Error", "Input file does not exist.")
+        return
+    dataset_path = filedialog.askdirectory(title="Select Dataset Folder")
+    if not dataset_path:
+        return
+    try:
+        compile_dataset(read_excel_export(input_path), dataset_path)
+        input_entry.delete(0, tk.END)
+        input_entry.insert(0, dataset_path)
+        messagebox.showinfo("Success", f"Dataset compiled to {dataset_path}")
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+
+# Worker processes (shared_dataset.POOL_CONTEXT uses spawn) re-import this module as __main__; the UI is only built
+# when the script itself is run, so they do not open windows of their own.
+if __name__ == '__main__':
+    root = tk.Tk()
+    root.title("CMS Metrics Reporting Tool by Advance")
+
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack()
+
+    # Input file selection
+    input_label = tk.Label(frame, text="Input Excel File:")
+    input_label.grid(row=0, column=0, sticky="e")
+    input_entry = tk.Entry(frame, width=40)
+    input_entry.grid(row=0, column=1)
+    input_button = tk.Button(frame, text="Browse", command=select_input_file)
+    input_button.grid(row=0, column=2)
+    compile_button = tk.Button(frame, text="Compile", command=compile_input_dataset)
+    compile_button.grid(row=0, column=3)
+
+    # Output file selection
+    output_label = tk.Label(frame, text="Output CSV File:")
+    output_label.grid(row=1, column=0, sticky="e")
+    output_entry = tk.Entry(frame, width=40)
+    output_entry.grid(row=1, column=1)
+    output_button = tk.Button(frame, text="Browse", command=select_output_file)
+    output_button.grid(row=1, column=2)
+
+    # Date range selection
+    start_date_label = tk.Label(frame, text="Start Date (YYYY-MM-DD):")
+    start_date_label.grid(row=2, column=0, sticky="e")
+    start_date_entry = tk.Entry(frame, width=20)
+    start_date_entry.grid(row=2, column=1, sticky="w")
+
+    end_date_label = tk.Label(frame, text="End Date (YYYY-MM-DD):")
+    end_date_label.grid(row=3, column=0, sticky="e")
+    end_date_entry = tk.Entry(frame, width=20)
+    end_date_entry.grid(row=3, column=1, sticky="w")
+
+    # Metric engine selection
+    engine_label = tk.Label(frame, text="Engine:")
+    engine_label.grid(row=4, column=0, sticky="e")
+    engine_var = tk.StringVar(value=DEFAULT_ENGINE)
+    engine_menu = tk.OptionMenu(frame, engine_var, *ENGINES)
+    engine_menu.grid(row=4, column=1, sticky="w")
+    drilldown_var = tk.BooleanVar(value=False)
+    drilldown_check = tk.Checkbutton(frame, text="Client drill-down", variable=drilldown_var)
+    drilldown_check.grid(row=4, column=2, sticky="w")
+
+    # Run button
+    run_button = tk.Button(frame, text="Generate Report", command=run_report, width=20)
+    run_button.grid(row=5, column=0, columnspan=2, pady=10)
+    preview_button = tk.Button(frame, text="Preview", command=preview_report, width=10)
+    preview_button.grid(row=5, column=2, pady=10)
+
+    # Prefill fields for testing
+    input_entry.insert(0, DEFAULT_EXCEL_PATH)
+    output_entry.insert(0, DEFAULT_OUTPUT_PATH)
+    start_date_entry.insert(0, DEFAULT_START_DATE)
+    end_date_entry.insert(0, DEFAULT_END_DATE)
+
+    root.mainloop()
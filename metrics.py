@@ -1,5 +1,11 @@
 import pandas as pd
+import importlib
+from pandas.api.types import infer_dtype
 import re
+import sys
+import time
+
+from dates import parse_dates, parse_sheet_dates
 
 # Settings
 RELEVANT_SHEETS = ["Client", "Ahpscreening", "Goalshortterm", "Ahpdischarge", "Interaction", "Interaction_referral"]
@@ -7,6 +13,12 @@ RELEVANT_SHEETS = ["Client", "Ahpscreening", "Goalshortterm", "Ahpdischarge", "I
 DEFAULT_START_DATE = '2023-01-01'
 # Default end date for metrics calculations
 DEFAULT_END_DATE = '2023-12-31'
+# Metric engine used by calculate_all_metrics:
+# - 'pandas': this module, the reference implementation.
+# - 'polars': polars_engine.py, the same metric definitions on polars lazy frames (requires the polars package).
+# - 'fused': fused_engine.py, pandas again, but each sheet is prepared and reduced once for all metrics that read it.
+DEFAULT_ENGINE = 'pandas'
+ENGINES = {'pandas': __name__, 'polars': 'polars_engine', 'fused': 'fused_engine'}
 # default path to the Excel file
 DEFAULT_EXCEL_PATH = 'data/metrics_data.xlsx'
 DEFAULT_OUTPUT_PATH = 'data/metrics_output.csv'
@@ -106,8 +118,55 @@ METRIC8_INTERACTION_DATE_COL = 'Interaction_CreateStamp'
 # - SDOH assessment date column:
 METRIC8_SDOH_DATE_COL = 'AhpscreeningSystem_DateAcceptedcompleted'
 
+# ====- Time to connection Settings -====:
+# Extra connection windows (in days) reported alongside #8 (7 days) and #9 (30 days), read off the same distribution.
+CONNECTION_REPORT_DAYS = [14, 60, 90]
+# Quantiles of days-to-connection included in the distribution; 0.5 is reported as the median.
+CONNECTION_QUANTILES = [0.25, 0.5, 0.75, 0.9]
+
 # ====- Metric #10-16 Settings -====:
 # These are calculated from previous metrics and do not require sheet/column settings.
+
+# ====- Required columns -====:
+# Columns each metric reads, by sheet, including the hard-coded ones of #15 and #16. Used by the pre-flight schema
+# check (dataset.validate_export) so a missing or renamed column is reported before the workbook is loaded,
+# instead of the metric silently returning 0.
+METRIC_REQUIRED_COLUMNS = {
+    1: {METRIC1_SHEET: [METRIC1_REFERRALTYPE_COL, METRIC1_DATE_COL]},
+    2: {METRIC2_SHEET: [METRIC2_CLIENTID_COL, METRIC2_REFERRALTYPE_COL, METRIC2_DUPLICATE_COL, METRIC2_DATE_COL]},
+    3: {METRIC3_SHEET: [METRIC3_CLIENTID_COL, METRIC3_STATUS_COL, METRIC3_EDITSTAMP_COL, METRIC3_DATE_COL]},
+    4: {METRIC4_SHEET: [METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL, METRIC4_CL1_COL, METRIC4_CL2_COL]},
+    5: {METRIC5_SHEET: [METRIC5_CLIENTID_COL, METRIC5_SDOH_DATE_COL]},
+    6: {METRIC6_SHEET: [METRIC6_CLIENTID_COL, METRIC6_STATUS_COL, METRIC6_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL]},
+    7: {METRIC7_SHEET: [METRIC7_CLIENTID_COL, METRIC7_TAXONOMY_COL, METRIC7_REFERRAL_DATE_COL]},
+    8: {
+        METRIC8_CLIENT_SHEET: [METRIC8_CLIENTID_COL, METRIC8_REFERRAL_DATE_COL],
+        METRIC8_INTERACTION_SHEET: [METRIC8_CLIENTID_COL, METRIC8_OUTCOME_COL, METRIC8_INTERACTION_DATE_COL],
+        METRIC8_AHPSCREENING_SHEET: [METRIC8_CLIENTID_COL, METRIC8_SDOH_DATE_COL],
+    },
+    15: {'Goalshortterm': ['Goalshortterm_Status', 'GoalshorttermOption_GoalClosureStatus', 'GoalshorttermSystem_StgDateCreated', 'GoalshorttermSystem_StgDateCompleted']},
+    16: {
+        'Interaction': ['Client_Id', 'InteractionOption_ContactOutcome', 'Interaction_CreateStamp'],
+        'Ahpscreening': ['Client_Id', 'Ahpscreening_CreateStamp', 'AhpscreeningOption_WellbeingCantrilsLadder1', 'AhpscreeningOption_WellbeingCantrilsLadder2'],
+    },
+}
+# Metrics computed from other metrics (or from the same inputs), and the metrics whose columns they need.
+METRIC_DEPENDENCIES = {
+    4: [3], 5: [3], 9: [8, 6], 8: [6], 10: [1, 3], 11: [3, 4], 12: [3, 5], 13: [6, 8], 14: [6, 9],
+}
+
+# ====- Date columns -====:
+# Date columns read by the metrics, per sheet. dates.parse_sheet_dates parses them once per load or report.
+SHEET_DATE_COLUMNS = {
+    METRIC1_SHEET: [METRIC1_DATE_COL, METRIC3_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL, METRIC8_REFERRAL_DATE_COL],
+    METRIC4_SHEET: [METRIC4_EDITSTAMP_COL, 'Ahpscreening_CreateStamp', METRIC5_SDOH_DATE_COL],
+    METRIC8_INTERACTION_SHEET: [METRIC8_INTERACTION_DATE_COL],
+    METRIC7_SHEET: [METRIC7_REFERRAL_DATE_COL],
+    'Goalshortterm': ['GoalshorttermSystem_StgDateCreated', 'GoalshorttermSystem_StgDateCompleted'],
+}
+# Client ID columns. Every load path (Excel, compiled dataset, shared Arrow dataset) and every report stores them the
+# same way, see normalize_client_ids, so ids compare and hash alike whichever path and engine the sheets went through.
+CLIENT_ID_COLUMNS = [METRIC8_CLIENTID_COL, METRIC7_CLIENTID_COL]
  
 # Metric #1
 # Number of Inbound Referrals into the CCH (CCO-1)
@@ -129,7 +188,7 @@ def calculate_inbound_referrals(df: pd.DataFrame, start_date: pd.Timestamp, end_
         return 0
     # filter by client Create Stamp within the date range
     if METRIC1_DATE_COL in df.columns:
-        df[METRIC1_DATE_COL] = pd.to_datetime(df[METRIC1_DATE_COL], errors='coerce')
+        df[METRIC1_DATE_COL] = parse_dates(df[METRIC1_DATE_COL])
         df = df[(df[METRIC1_DATE_COL] >= start_date) & (df[METRIC1_DATE_COL] <= end_date)]
     # Only count rows with a non-null, non-empty referral type
     filtered = df[df[METRIC1_REFERRALTYPE_COL].notnull() & (df[METRIC1_REFERRALTYPE_COL].astype(str).str.strip() != '')]
@@ -165,7 +224,7 @@ def calculate_unique_individuals_referred(df: pd.DataFrame, start_date: pd.Times
             return 0
         # Ensure date filtering if applicable
     if METRIC2_DATE_COL in df.columns:
-        df[METRIC2_DATE_COL] = pd.to_datetime(df[METRIC2_DATE_COL], errors='coerce')
+        df[METRIC2_DATE_COL] = parse_dates(df[METRIC2_DATE_COL])
         df = df[(df[METRIC2_DATE_COL] >= start_date) & (df[METRIC2_DATE_COL] <= end_date)]
     filtered = df[
         df[METRIC2_REFERRALTYPE_COL].notnull() &
@@ -205,10 +264,10 @@ def calculate_enrolled_clients(df: pd.DataFrame, start_date: pd.Timestamp, end_d
         return 0, []
     # Only restrict by Client_CreateStamp <= end_date
     if METRIC3_DATE_COL in df.columns:
-        df[METRIC3_DATE_COL] = pd.to_datetime(df[METRIC3_DATE_COL], errors='coerce')
+        df[METRIC3_DATE_COL] = parse_dates(df[METRIC3_DATE_COL])
         df = df[df[METRIC3_DATE_COL] <= end_date]
     df_sorted = df.copy()
-    df_sorted[METRIC3_EDITSTAMP_COL] = pd.to_datetime(df_sorted[METRIC3_EDITSTAMP_COL], errors='coerce')
+    df_sorted[METRIC3_EDITSTAMP_COL] = parse_dates(df_sorted[METRIC3_EDITSTAMP_COL])
     # Sort by Client_Id and Client_EditStamp ascending, so first is earliest
     df_sorted = df_sorted.sort_values([METRIC3_CLIENTID_COL, METRIC3_EDITSTAMP_COL], ascending=[True, True])
     earliest_status = df_sorted.drop_duplicates(subset=[METRIC3_CLIENTID_COL], keep='first')
@@ -259,7 +318,7 @@ def calculate_enrolled_clients_priority_population(df: pd.DataFrame, listOfEnrol
     if df_clients.empty:
         return 0
     # Convert to datetime for sorting
-    df_clients[METRIC4_EDITSTAMP_COL] = pd.to_datetime(df_clients[METRIC4_EDITSTAMP_COL], errors='coerce')
+    df_clients[METRIC4_EDITSTAMP_COL] = parse_dates(df_clients[METRIC4_EDITSTAMP_COL])
     # Get earliest screening for each client (with valid Cantrils Ladder data)
     df_clients = df_clients.sort_values([METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL])
     first_screenings = df_clients.drop_duplicates(subset=[METRIC4_CLIENTID_COL], keep='first')
@@ -297,8 +356,7 @@ def calculate_enrolled_clients_with_sdoh_assessment(df: pd.DataFrame, listOfEnro
     if df_clients.empty:
         return 0
     # Convert to datetime, keep only valid dates
-    df_clients[METRIC5_SDOH_DATE_COL] = pd.to_datetime(
-        df_clients[METRIC5_SDOH_DATE_COL], errors='coerce')
+    df_clients[METRIC5_SDOH_DATE_COL] = parse_dates(df_clients[METRIC5_SDOH_DATE_COL])
     # Count unique clients with at least one valid assessment date
     valid = df_clients.dropna(subset=[METRIC5_SDOH_DATE_COL])
     unique_clients = valid[METRIC5_CLIENTID_COL].nunique()
@@ -326,11 +384,11 @@ def calculate_new_enrolled_clients(df: pd.DataFrame, start_date: pd.Timestamp, e
         return 0, []
     # filter by client Create Stamp within the date range
     if METRIC6_OPTIN_DATE_COL in df.columns:
-        df[METRIC6_OPTIN_DATE_COL] = pd.to_datetime(df[METRIC6_OPTIN_DATE_COL], errors='coerce')
+        df[METRIC6_OPTIN_DATE_COL] = parse_dates(df[METRIC6_OPTIN_DATE_COL])
         df = df[(df[METRIC6_OPTIN_DATE_COL] >= start_date) & (df[METRIC6_OPTIN_DATE_COL] <= end_date)]
     # Convert dates
     df_sorted = df.copy()
-    df_sorted[METRIC6_EDITSTAMP_COL] = pd.to_datetime(df_sorted[METRIC6_EDITSTAMP_COL], errors='coerce')
+    df_sorted[METRIC6_EDITSTAMP_COL] = parse_dates(df_sorted[METRIC6_EDITSTAMP_COL])
     # Sort by Client_Id and Client_EditStamp descending, so first is most recent
     df_sorted = df_sorted.sort_values([METRIC6_CLIENTID_COL, METRIC6_EDITSTAMP_COL], ascending=[True, False])
     # Drop duplicates to keep only the most recent status per client
@@ -367,7 +425,7 @@ def calculate_outbound_referrals_type(df: pd.DataFrame, start_date: pd.Timestamp
     if METRIC7_CLIENTID_COL not in df.columns or METRIC7_TAXONOMY_COL not in df.columns or METRIC7_REFERRAL_DATE_COL not in df.columns:
         return {}
     # Filter by referral date within the date range
-    df[METRIC7_REFERRAL_DATE_COL] = pd.to_datetime(df[METRIC7_REFERRAL_DATE_COL], errors='coerce')
+    df[METRIC7_REFERRAL_DATE_COL] = parse_dates(df[METRIC7_REFERRAL_DATE_COL])
     df = df[(df[METRIC7_REFERRAL_DATE_COL] >= start_date) & (df[METRIC7_REFERRAL_DATE_COL] <= end_date)]
     hrsn_referralsDict = {}
     for _, row in df.iterrows():
@@ -413,51 +471,12 @@ def calculate_outbound_referrals_type(df: pd.DataFrame, start_date: pd.Timestamp
 def calculate_newly_enrolled_clients_connected_to_cbcc_7_days(client_df: pd.DataFrame, interaction_df: pd.DataFrame, ahpscreening_df: pd.DataFrame, newly_enrolled_client_ids: list) -> int:
     """
     Number of newly enrolled clients connected to CBCC services within 7 days of referral.
-    For each client in newly_enrolled_client_ids, count as connected if:
-    - There is an interaction in interaction_df where METRIC8_OUTCOME_COL is in SERVICES_PROVIDED, the client ID is in newly_enrolled_client_ids, and the METRIC8_INTERACTION_DATE_COL is within 7 days of METRIC8_REFERRAL_DATE_COL.
-    OR
-    - There is a row in ahpscreening_df where METRIC8_SDOH_DATE_COL is within 7 days of METRIC8_REFERRAL_DATE_COL and client ID is in newly_enrolled_client_ids.
-    Returns the number of unique clients meeting these criteria.
-    """
-    if not newly_enrolled_client_ids:
-        print('[DEBUG] Metric #8: No newly enrolled client IDs provided.')
-        return 0
-    referral_dates = client_df.set_index(METRIC8_CLIENTID_COL)[METRIC8_REFERRAL_DATE_COL].to_dict()
-    clients_served = set()
-    print(f"[DEBUG] Metric #8: Number of Newly enrolled clients: {len(newly_enrolled_client_ids)}")
-    # --- Interactions logic ---
-    if (
-        METRIC8_CLIENTID_COL in interaction_df.columns and
-        METRIC8_OUTCOME_COL in interaction_df.columns and
-        METRIC8_INTERACTION_DATE_COL in interaction_df.columns
-    ):
-        interaction_df[METRIC8_INTERACTION_DATE_COL] = pd.to_datetime(interaction_df[METRIC8_INTERACTION_DATE_COL], errors='coerce')
-        for _, row in interaction_df.iterrows():
-            client_id = row[METRIC8_CLIENTID_COL]
-            if client_id in newly_enrolled_client_ids and client_id in referral_dates:
-                referral_date = pd.to_datetime(referral_dates[client_id], errors='coerce')
-                if pd.notnull(referral_date):
-                    interaction_date = row[METRIC8_INTERACTION_DATE_COL]
-                    if pd.notnull(interaction_date) and (interaction_date - referral_date).days <= 7:
-                        outcome = row[METRIC8_OUTCOME_COL]
-                        if outcome in SERVICES_PROVIDED:
-                            clients_served.add(client_id)
-    # --- Ahpscreening logic ---
-    if (
-        METRIC8_CLIENTID_COL in ahpscreening_df.columns and
-        METRIC8_SDOH_DATE_COL in ahpscreening_df.columns
-    ):
-        ahpscreening_df[METRIC8_SDOH_DATE_COL] = pd.to_datetime(ahpscreening_df[METRIC8_SDOH_DATE_COL], errors='coerce')
-        for _, row in ahpscreening_df.iterrows():
-            client_id = row[METRIC8_CLIENTID_COL]
-            if client_id in newly_enrolled_client_ids and client_id in referral_dates:
-                referral_date = pd.to_datetime(referral_dates[client_id], errors='coerce')
-                if pd.notnull(referral_date):
-                    sdoh_date = row[METRIC8_SDOH_DATE_COL]
-                    if pd.notnull(sdoh_date) and (sdoh_date - referral_date).days <= 7:
-                        clients_served.add(client_id)
-    print(f"[DEBUG] Metric #8: Total unique clients connected in 7 days: {len(clients_served)}")
-    return len(clients_served)
+    A client counts as connected if they have an interaction whose METRIC8_OUTCOME_COL is in SERVICES_PROVIDED, or a
+    METRIC8_SDOH_DATE_COL value, within 7 days of their METRIC8_REFERRAL_DATE_COL.
+    Read off the days-to-connection distribution (see calculate_days_to_connection below), as calculate_all_metrics does.
+    """
+    days_to_connection = calculate_days_to_connection(client_df, interaction_df, ahpscreening_df, newly_enrolled_client_ids)
+    return connected_within(calculate_connection_distribution(days_to_connection), 7)
 
 
 # Metric #9:
@@ -466,49 +485,85 @@ def calculate_newly_enrolled_clients_connected_to_cbcc_7_days(client_df: pd.Data
 def calculate_newly_enrolled_clients_connected_to_cbcc_30_days(client_df: pd.DataFrame, interaction_df: pd.DataFrame, ahpscreening_df: pd.DataFrame, newly_enrolled_client_ids: list) -> int:
     """
     Number of newly enrolled clients connected to CBCC services within 30 days of referral.
-    For each client in newly_enrolled_client_ids, count as connected if:
-    - There is an interaction in interaction_df where METRIC8_OUTCOME_COL is in SERVICES_PROVIDED, the client ID is in newly_enrolled_client_ids, and the METRIC8_INTERACTION_DATE_COL is within 30 days of METRIC8_REFERRAL_DATE_COL.
-    OR
-    - There is a row in ahpscreening_df where METRIC8_SDOH_DATE_COL is within 30 days of METRIC8_REFERRAL_DATE_COL and client ID is in newly_enrolled_client_ids.
-    Returns the number of unique clients meeting these criteria.
-    """
-    if not newly_enrolled_client_ids:
-        print('[DEBUG] Metric #9: No newly enrolled client IDs provided.')
+    Same as calculate_newly_enrolled_clients_connected_to_cbcc_7_days with a 30 day window.
+    """
+    days_to_connection = calculate_days_to_connection(client_df, interaction_df, ahpscreening_df, newly_enrolled_client_ids)
+    return connected_within(calculate_connection_distribution(days_to_connection), 30)
+
+
+# Time to connection:
+# Generalizes Metric #8 and #9. Instead of one yes/no answer per window, we compute once, for each newly enrolled client,
+# the number of days from ClientSystem_CcProgramReferralDate to their first qualifying event, where a qualifying event
+# is the same as in #8/#9: an interaction whose InteractionOption_ContactOutcome is in SERVICES_PROVIDED, or an
+# AhpscreeningSystem_DateAcceptedcompleted value.
+# Days are counted like #8/#9 do, (event - referral).days, so a client is connected within N days exactly when days <= N.
+# A first event dated before the referral counts as day 0: the client was already connected when referred. #8/#9
+# always counted such clients (a negative difference is within every window), and clipping keeps negative days out of
+# the median and the histogram.
+# Every window (7, 14, 30, 60, 90, ...) and the median are then read off the distribution of these days.
+def calculate_days_to_connection(client_df: pd.DataFrame, interaction_df: pd.DataFrame, ahpscreening_df: pd.DataFrame, newly_enrolled_client_ids: list) -> pd.Series:
+    """
+    Days from referral to first qualifying service/SDOH event for each newly enrolled client.
+    Like #8/#9, the referral date is taken from the last Client row of each client.
+    Returns a Series indexed by client id (one entry per newly enrolled client), never negative, NaN where the client
+    has no referral date or no qualifying event.
+    """
+    ids = pd.Index(pd.unique(pd.Series(newly_enrolled_client_ids, dtype=object)))
+    if ids.empty or METRIC8_CLIENTID_COL not in client_df.columns or METRIC8_REFERRAL_DATE_COL not in client_df.columns:
+        return pd.Series(float('nan'), index=ids)
+    referral_dates = client_df.drop_duplicates(subset=[METRIC8_CLIENTID_COL], keep='last').set_index(METRIC8_CLIENTID_COL)[METRIC8_REFERRAL_DATE_COL]
+    referral_dates = parse_dates(referral_dates).reindex(ids)
+    first_events = []
+    if METRIC8_CLIENTID_COL in interaction_df.columns and METRIC8_OUTCOME_COL in interaction_df.columns and METRIC8_INTERACTION_DATE_COL in interaction_df.columns:
+        services = interaction_df[interaction_df[METRIC8_OUTCOME_COL].isin(SERVICES_PROVIDED)]
+        dates = parse_dates(services[METRIC8_INTERACTION_DATE_COL])
+        first_events.append(dates.groupby(services[METRIC8_CLIENTID_COL]).min())
+    if METRIC8_CLIENTID_COL in ahpscreening_df.columns and METRIC8_SDOH_DATE_COL in ahpscreening_df.columns:
+        dates = parse_dates(ahpscreening_df[METRIC8_SDOH_DATE_COL])
+        first_events.append(dates.groupby(ahpscreening_df[METRIC8_CLIENTID_COL]).min())
+    if not first_events:
+        return pd.Series(float('nan'), index=ids)
+    first_event = pd.concat([events.reindex(ids) for events in first_events], axis=1).min(axis=1)
+    return (first_event - referral_dates).dt.days.clip(lower=0)
+
+
+def calculate_connection_distribution(days_to_connection: pd.Series, quantiles: list = CONNECTION_QUANTILES) -> dict:
+    """
+    Distribution of days-to-connection, as returned by calculate_days_to_connection.
+    Returns a dictionary with:
+    - 'clients': number of newly enrolled clients
+    - 'connected': number of clients with a qualifying event at any time
+    - 'histogram': {days: number of clients}
+    - 'quantiles': {q: days} over connected clients (None when nobody connected)
+    - 'cumulative', 'first_day': cumulative client counts for every day from first_day on, used by connected_within
+    """
+    days = days_to_connection.dropna().astype(int)
+    histogram = days.value_counts().sort_index()
+    if histogram.empty:
+        cumulative, first_day = [], 0
+    else:
+        first_day = int(histogram.index[0])
+        cumulative = histogram.reindex(range(first_day, int(histogram.index[-1]) + 1), fill_value=0).cumsum().tolist()
+    return {
+        'clients': len(days_to_connection),
+        'connected': len(days),
+        'histogram': {int(day): int(count) for day, count in histogram.items()},
+        'quantiles': {q: (float(days.quantile(q)) if len(days) else None) for q in quantiles},
+        'cumulative': cumulative,
+        'first_day': first_day,
+    }
+
+
+def connected_within(distribution: dict, days: int) -> int:
+    """
+    Number of clients connected within `days` days of referral (days-to-connection <= days), in constant time.
+    connected_within(distribution, 7) and (distribution, 30) are Metric #8 and #9.
+    """
+    cumulative = distribution['cumulative']
+    position = days - distribution['first_day']
+    if not cumulative or position < 0:
         return 0
-    referral_dates = client_df.set_index(METRIC8_CLIENTID_COL)[METRIC8_REFERRAL_DATE_COL].to_dict()
-    clients_served = set()
-    print(f"[DEBUG] Metric #9: Number of Newly enrolled clients: {len(newly_enrolled_client_ids)}")
-    # --- Interactions logic ---
-    if (
-        METRIC8_CLIENTID_COL in interaction_df.columns and
-        METRIC8_OUTCOME_COL in interaction_df.columns and
-        METRIC8_INTERACTION_DATE_COL in interaction_df.columns
-    ):
-        for _, row in interaction_df.iterrows():
-            client_id = row[METRIC8_CLIENTID_COL]
-            if client_id in newly_enrolled_client_ids and client_id in referral_dates:
-                referral_date = pd.to_datetime(referral_dates[client_id], errors='coerce')
-                if pd.notnull(referral_date):
-                    interaction_date = pd.to_datetime(row[METRIC8_INTERACTION_DATE_COL], errors='coerce')
-                    if pd.notnull(interaction_date) and (interaction_date - referral_date).days <= 30:
-                        outcome = row[METRIC8_OUTCOME_COL]
-                        if outcome in SERVICES_PROVIDED:
-                            clients_served.add(client_id)
-    # --- Ahpscreening logic ---
-    if (
-        METRIC8_CLIENTID_COL in ahpscreening_df.columns and
-        METRIC8_SDOH_DATE_COL in ahpscreening_df.columns
-    ):
-        for _, row in ahpscreening_df.iterrows():
-            client_id = row[METRIC8_CLIENTID_COL]
-            if client_id in newly_enrolled_client_ids and client_id in referral_dates:
-                referral_date = pd.to_datetime(referral_dates[client_id], errors='coerce')
-                if pd.notnull(referral_date):
-                    sdoh_date = pd.to_datetime(row[METRIC8_SDOH_DATE_COL], errors='coerce')
-                    if pd.notnull(sdoh_date) and (sdoh_date - referral_date).days <= 30:
-                        clients_served.add(client_id)
-    print(f"[DEBUG] Metric #9: Total unique clients connected in 30 days: {len(clients_served)}")
-    return len(clients_served)
+    return cumulative[min(position, len(cumulative) - 1)]
 
 
 # Metric #10:
@@ -573,8 +628,8 @@ def calculate_identified_client_needs_met(df: pd.DataFrame, start_date: pd.Times
         print("[DEBUG] Required columns missing!")
         return 0.0
     # Filter by date range
-    df['GoalshorttermSystem_StgDateCreated'] = pd.to_datetime(df['GoalshorttermSystem_StgDateCreated'], errors='coerce')
-    df['GoalshorttermSystem_StgDateCompleted'] = pd.to_datetime(df['GoalshorttermSystem_StgDateCompleted'], errors='coerce')
+    df['GoalshorttermSystem_StgDateCreated'] = parse_dates(df['GoalshorttermSystem_StgDateCreated'])
+    df['GoalshorttermSystem_StgDateCompleted'] = parse_dates(df['GoalshorttermSystem_StgDateCompleted'])
     # filtered_df = df[(df['GoalshorttermSystem_StgDateCreated'] >= start_date) & (df['GoalshorttermSystem_StgDateCompleted'] <= end_date)]
     filtered_df = df[(df['GoalshorttermSystem_StgDateCreated'] >= start_date) & (df['GoalshorttermSystem_StgDateCreated'] <= end_date)]           
     if filtered_df.empty:
@@ -610,7 +665,7 @@ def get_discharged_clients(df: pd.DataFrame, start_date: pd.Timestamp, end_date:
        'Interaction_CreateStamp' not in df.columns:
         return []
     df_filtered = df[df['InteractionOption_ContactOutcome'].astype(str).str.contains('discharged', case=False, na=False)].copy()
-    df_filtered['Interaction_CreateStamp'] = pd.to_datetime(df_filtered['Interaction_CreateStamp'], errors='coerce')
+    df_filtered['Interaction_CreateStamp'] = parse_dates(df_filtered['Interaction_CreateStamp'])
     in_range = df_filtered[(df_filtered['Interaction_CreateStamp'] >= start_date) & (df_filtered['Interaction_CreateStamp'] <= end_date)]
     return in_range['Client_Id'].dropna().unique().tolist()
     
@@ -659,7 +714,7 @@ def calculate_discharged_clients_wellbeing_improvement(df: pd.DataFrame, dischar
     if df_clients.empty:
         print("[DEBUG] No valid screenings with both Cantrils Ladder columns present.")
         return 0.0
-    df_clients['Ahpscreening_CreateStamp'] = pd.to_datetime(df_clients['Ahpscreening_CreateStamp'], errors='coerce')
+    df_clients['Ahpscreening_CreateStamp'] = parse_dates(df_clients['Ahpscreening_CreateStamp'])
     df_clients['CL1_num'] = df_clients['AhpscreeningOption_WellbeingCantrilsLadder1'].apply(extract_first_digit)
     df_clients['CL2_num'] = df_clients['AhpscreeningOption_WellbeingCantrilsLadder2'].apply(extract_first_digit)
 
@@ -741,102 +796,203 @@ def cantrils_ladder_category(q1: int | None, q2: int | None) -> str:
 
 
 
-def calculate_all_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.DataFrame:
+def prepare_data(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Convert the input sheets into the form this engine's metric functions take, for a report over [start_date, end_date].
+    The pandas engine works on the DataFrames as read, so this is a no-op; see polars_engine.prepare_data and fused_engine.prepare_data.
+    """
+    return dfDict
+
+
+# Input normalization
+# Excel columns can hold a mix of numbers and text: a client id typed as 12 on one row and '12' on another, or a
+# free-text answer that is sometimes a number. Engines differ in how they treat such a column (polars cannot hold it
+# at all), so iter_metrics normalizes the sheets once, before handing them to any engine, and the load and publish
+# paths store them the same way.
+
+def normalize_client_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns df with its CLIENT_ID_COLUMNS in one canonical form, as read_excel stores a clean id column:
+    numbers (int64, or float64 when some ids are missing) when every id is a number or numeric text, otherwise text.
+    Blank ids become missing. Other columns are left unchanged; df is returned as is when there is nothing to convert.
+    """
+    cols = [col for col in CLIENT_ID_COLUMNS if col in df.columns and df[col].dtype == object]
+    if not cols:
+        return df
+    df = df.copy()
+    for col in cols:
+        ids = df[col]
+        blank = ids.isnull() | (ids.astype(str).str.strip() == '')
+        numbers = pd.to_numeric(ids.where(~blank), errors='coerce')
+        if numbers.notnull().sum() == (~blank).sum():
+            whole = not blank.any() and (numbers % 1 == 0).all()
+            df[col] = numbers.astype('int64') if whole else numbers.astype('float64')
+        else:
+            df[col] = ids.astype(str).str.strip().where(~blank, None)
+    return df
+
+
+def normalize_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns df with its client ids normalized (normalize_client_ids) and every other object column holding more than
+    one value type converted to text, which is also what Arrow-based formats need to store it.
+    Columns with a single value type are left unchanged, and df itself is returned when nothing changes.
+    """
+    df = normalize_client_ids(df)
+    mixed = [
+        col for col in df.columns[df.dtypes == object]
+        if col not in CLIENT_ID_COLUMNS and infer_dtype(df[col], skipna=True).startswith('mixed')
+    ]
+    if not mixed:
+        return df
+    return df.assign(**{col: df[col].where(df[col].isnull(), df[col].astype(str)) for col in mixed})
+
+
+def get_engine(name: str):
+    """
+    Returns the module implementing the metric functions for the given engine name (see ENGINES).
+    Raises ValueError for an unknown engine name.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown metric engine '{name}'. Available engines: {', '.join(ENGINES)}")
+    if ENGINES[name] == __name__:
+        return sys.modules[__name__]
+    return importlib.import_module(ENGINES[name])
+
+
+# Streaming evaluation
+# iter_metrics computes the metrics in report order and yields each row as soon as its value is known, with the time
+# it took and a status, so callers can show or persist partial results (see report_stream.py for writers).
+# A metric that raises is reported with Status 'error: ...' and Value None, and the metrics computed from it are
+# reported as 'skipped: ...'; every other metric is still computed. Rows that share one computation (#8, #9, the
+# extra connection windows and the median) all report that computation's error.
+
+# Marks a failed intermediate result inside iter_metrics.
+_FAILED = object()
+
+
+def _run_metric(fn, *args, raise_errors: bool = False) -> tuple:
+    """
+    Run fn(*args), timing it. Returns (value, seconds, status); value is _FAILED when fn raised or an input had failed.
+    With raise_errors=True an exception from fn propagates instead.
+    """
+    if any(arg is _FAILED for arg in args):
+        return _FAILED, 0.0, 'skipped: an input metric failed'
+    started = time.perf_counter()
+    try:
+        value = fn(*args)
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"[DEBUG] {getattr(fn, '__name__', fn)} failed: {e}")
+        return _FAILED, time.perf_counter() - started, f'error: {e}'
+    return value, time.perf_counter() - started, 'ok'
+
+
+def _metric_row(title: str, description: str, value, seconds: float, status: str) -> dict:
+    return {
+        'Metric': title,
+        'Value': None if value is _FAILED else value,
+        'Description': description,
+        'Seconds': seconds,
+        'Status': status,
+    }
+
+
+def _split(result) -> tuple:
+    """
+    Split a (count, client ids) metric result, keeping a failure marker on both parts.
+    """
+    return (_FAILED, _FAILED) if result is _FAILED else result
+
+
+def iter_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, engine: str = DEFAULT_ENGINE, raise_errors: bool = False):
+    """
+    Generator over the rows of calculate_all_metrics, in the same order, each yielded as soon as it is computed.
+    Each row is a dict with keys Metric, Value, Description, Seconds (time spent on that metric, including shared
+    inputs computed for it) and Status ('ok', 'error: ...' or 'skipped: ...').
+    With raise_errors=True the first failing metric raises instead.
+    """
+    m = get_engine(engine)
+    # Date columns are parsed once for the whole report, with one format cache shared by all sheets, and client ids
+    # and mixed-type columns are normalized once, so every engine gets the same values
+    sheets = {name: normalize_mixed_columns(df) for name, df in parse_sheet_dates(dfDict, SHEET_DATE_COLUMNS).items()}
+    yield from iter_prepared_metrics(m, m.prepare_data(sheets, start_date, end_date), start_date, end_date, raise_errors=raise_errors)
+
+
+def iter_prepared_metrics(m, dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, raise_errors: bool = False):
+    """
+    The rows of iter_metrics, from sheets already converted by m.prepare_data, where m is an engine module (get_engine).
+    Callers that build an engine's inputs themselves (breakdowns.py) use this to get the same rows, titles and
+    statuses as a report.
+    """
+    def run(fn, *args):
+        return _run_metric(fn, *args, raise_errors=raise_errors)
+
+    inbound_referrals, seconds, status = run(m.calculate_inbound_referrals, dfDict[METRIC1_SHEET], start_date, end_date)
+    yield _metric_row('Number of Inbound Referrals into the CCH', 'Unique inbound referrals into the CCH.', inbound_referrals, seconds, status)
+    value, seconds, status = run(m.calculate_unique_individuals_referred, dfDict['Client'], start_date, end_date)
+    yield _metric_row('Number of unique Individuals Referred into the CCH', 'Unique individuals referred into the CCH.', value, seconds, status)
+    result, seconds, status = run(m.calculate_enrolled_clients, dfDict['Client'], start_date, end_date)
+    number_enrolled, enrolled_clients = _split(result)
+    yield _metric_row('Number of Enrolled Clients', 'Unique clients enrolled in the CCH.', number_enrolled, seconds, status)
+    num_priority_population, seconds, status = run(m.calculate_enrolled_clients_priority_population, dfDict['Ahpscreening'], enrolled_clients)
+    yield _metric_row('Number of Enrolled Clients from Priority Population', 'Enrolled clients from priority populations based on Cantrils Ladder scores.', num_priority_population, seconds, status)
+    num_with_sdoh_assessment, seconds, status = run(m.calculate_enrolled_clients_with_sdoh_assessment, dfDict['Ahpscreening'], enrolled_clients)
+    yield _metric_row('Number of Enrolled Clients with an SDOH assessment', 'Enrolled clients who have completed an SDOH assessment.', num_with_sdoh_assessment, seconds, status)
+    result, seconds, status = run(m.calculate_new_enrolled_clients, dfDict['Client'], start_date, end_date)
+    num_newly_enrolled, newly_enrolled_clients = _split(result)
+    yield _metric_row('Number of Newly Enrolled Clients', 'Unique clients newly enrolled in the CCH during the reporting period.', num_newly_enrolled, seconds, status)
+    # Metric #7: Outbound referrals by HRSN category
+    outbound_referrals_by_type, seconds, status = run(m.calculate_outbound_referrals_type, dfDict['Interaction_referral'], start_date, end_date)
+    if outbound_referrals_by_type is _FAILED:
+        yield _metric_row('Number of Outbound Referrals to HRSN Services', 'Total outbound referrals made from the CCH to HRSN services.', _FAILED, seconds, status)
+    else:
+        for category, count in outbound_referrals_by_type.items():
+            yield _metric_row(f'Number of Outbound Referrals to HRSN Services: {category}', f'Total outbound referrals made from the CCH to HRSN services in category: {category}.', count, seconds, status)
+            seconds = 0.0
+    # Metric #8 and #9 (and the extra connection windows below) are read off one days-to-connection distribution
+    days_to_connection, seconds, connection_status = run(m.calculate_days_to_connection, dfDict['Client'], dfDict['Interaction'], dfDict['Ahpscreening'], newly_enrolled_clients)
+    discharged_clients, discharged_seconds, discharged_status = run(m.get_discharged_clients, dfDict['Interaction'], start_date, end_date)
+    connection_distribution, distribution_seconds, status = run(calculate_connection_distribution, days_to_connection)
+    seconds += distribution_seconds
+    # The rows read off the distribution report the error of the shared computation that failed, not a skip
+    if days_to_connection is not _FAILED:
+        connection_status = status
+    num_connected_in_7_days, _, _ = run(connected_within, connection_distribution, 7)
+    num_connected_in_30_days, _, _ = run(connected_within, connection_distribution, 30)
+    yield _metric_row('Number of newly enrolled clients connected to CBCC services within 7 days of referral', 'Clients who were newly enrolled in the CCH and connected to CBCC services within 7 days of referral.', num_connected_in_7_days, seconds, connection_status)
+    yield _metric_row('Number of newly enrolled clients connected to CBCC services within 30 days of referral', 'Clients who were newly enrolled in the CCH and connected to CBCC services within 30 days of referral.', num_connected_in_30_days, 0.0, connection_status)
+    value, seconds, status = run(calculate_enrollment_percentage, number_enrolled, inbound_referrals)
+    yield _metric_row('Percent of individuals referred to the CCH who are enrolled in the CCH.', 'Percentage of individuals referred to the CCH who are enrolled in the CCH.', value, seconds, status)
+    value, seconds, status = run(calculate_priority_population_percentage, num_priority_population, number_enrolled)
+    yield _metric_row('Percent of enrolled clients from priority populations.', 'Percentage of enrolled clients who are from priority populations.', value, seconds, status)
+    value, seconds, status = run(calculate_sdoh_assessment_percentage, num_with_sdoh_assessment, number_enrolled)
+    yield _metric_row('Percent of enrolled clients with an SDOH assessment.', 'Enrolled clients who have completed an SDOH assessment.', value, seconds, status)
+    value, seconds, status = run(calculate_percent_newly_enrolled_clients_connected_to_cbcc_7_days, num_connected_in_7_days, num_newly_enrolled)
+    yield _metric_row('Percent of newly enrolled clients connected to CBCC services within 7 days of referral.', 'Percentage of newly enrolled clients connected to CBCC services within 7 days of referral.', value, seconds, status)
+    value, seconds, status = run(calculate_percent_newly_enrolled_clients_connected_to_cbcc_30_days, num_connected_in_30_days, num_newly_enrolled)
+    yield _metric_row('Percent of newly enrolled clients connected to CBCC services within 30 days of referral.', 'Percentage of newly enrolled clients connected to CBCC services within 30 days of referral.', value, seconds, status)
+    value, seconds, status = run(m.calculate_identified_client_needs_met, dfDict['Goalshortterm'], start_date, end_date)
+    yield _metric_row('Percent of identified client needs that were successfully met.', 'Percentage of identified client needs that were successfully met during the reporting period.', value, seconds, status)
+    value, seconds, status = run(m.calculate_discharged_clients_wellbeing_improvement, dfDict['Ahpscreening'], discharged_clients)
+    if discharged_status != 'ok':
+        status = discharged_status
+    yield _metric_row('Percent of Discharged Clients Reporting Improved Wellbeing', 'Percentage of discharged clients who reported improved wellbeing based on Cantrils Ladder scores.', value, seconds + discharged_seconds, status)
+    # Time to connection: additional windows and the median, from the same distribution as #8 and #9
+    for days in CONNECTION_REPORT_DAYS:
+        value, seconds, status = run(connected_within, connection_distribution, days)
+        yield _metric_row(f'Number of newly enrolled clients connected to CBCC services within {days} days of referral', f'Clients who were newly enrolled in the CCH and connected to CBCC services within {days} days of referral.', value, seconds, connection_status if connection_distribution is _FAILED else status)
+    value, seconds, status = run(lambda distribution: distribution['quantiles'].get(0.5), connection_distribution)
+    yield _metric_row('Median days from referral to CBCC services connection', 'Median number of days from referral to the first CBCC service or SDOH assessment, over newly enrolled clients who connected.', value, seconds, connection_status if connection_distribution is _FAILED else status)
+
+
+def calculate_all_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, engine: str = DEFAULT_ENGINE) -> pd.DataFrame:
     """
     Calculate all required AHP metrics from the input DataFrame.
+    engine selects the implementation of metrics #1-#9, #15 and #16 (see ENGINES); the percentages are engine independent.
     Returns a DataFrame with one row per metric and columns: Metric, Value, Description.
+    Raises the first metric error; use iter_metrics to keep going past failures.
     """
-    metrics = []
-    inbound_referrals = calculate_inbound_referrals(dfDict[METRIC1_SHEET], start_date, end_date)
-    metrics.append({
-        'Metric': 'Number of Inbound Referrals into the CCH',
-        'Value': inbound_referrals,
-        'Description': 'Unique inbound referrals into the CCH.'
-    })
-    metrics.append({
-        'Metric': 'Number of unique Individuals Referred into the CCH',
-        'Value': calculate_unique_individuals_referred(dfDict['Client'], start_date, end_date),
-        'Description': 'Unique individuals referred into the CCH.'
-    })
-    number_enrolled, enrolled_clients = calculate_enrolled_clients(dfDict['Client'], start_date, end_date)
-    metrics.append({
-        'Metric': 'Number of Enrolled Clients',
-        'Value': number_enrolled,
-        'Description': 'Unique clients enrolled in the CCH.'
-    })
-    num_priority_population = calculate_enrolled_clients_priority_population(dfDict['Ahpscreening'], enrolled_clients)
-    metrics.append({
-        'Metric': 'Number of Enrolled Clients from Priority Population',
-        'Value': num_priority_population,
-        'Description': 'Enrolled clients from priority populations based on Cantrils Ladder scores.'
-    })
-    num_with_sdoh_assessment = calculate_enrolled_clients_with_sdoh_assessment(dfDict['Ahpscreening'], enrolled_clients)
-    metrics.append({
-        'Metric': 'Number of Enrolled Clients with an SDOH assessment',
-        'Value': num_with_sdoh_assessment,
-        'Description': 'Enrolled clients who have completed an SDOH assessment.'
-    })
-    num_newly_enrolled, newly_enrolled_clients = calculate_new_enrolled_clients(dfDict['Client'], start_date, end_date)
-    metrics.append({
-        'Metric': 'Number of Newly Enrolled Clients',
-        'Value': num_newly_enrolled,
-        'Description': 'Unique clients newly enrolled in the CCH during the reporting period.'
-    })
-    # Metric #7: Outbound referrals by HRSN category
-    outbound_referrals_by_type = calculate_outbound_referrals_type(dfDict['Interaction_referral'], start_date, end_date)
-    for category, count in outbound_referrals_by_type.items():
-        metrics.append({
-            'Metric': f'Number of Outbound Referrals to HRSN Services: {category}',
-            'Value': count,
-            'Description': f'Total outbound referrals made from the CCH to HRSN services in category: {category}.'
-        })
-    num_connected_in_7_days = calculate_newly_enrolled_clients_connected_to_cbcc_7_days(dfDict['Client'], dfDict['Interaction'], dfDict['Ahpscreening'], newly_enrolled_clients)
-    metrics.append({
-        'Metric': 'Number of newly enrolled clients connected to CBCC services within 7 days of referral',
-        'Value': num_connected_in_7_days,
-        'Description': 'Clients who were newly enrolled in the CCH and connected to CBCC services within 7 days of referral.'
-    })
-    num_connected_in_30_days = calculate_newly_enrolled_clients_connected_to_cbcc_30_days(dfDict['Client'], dfDict['Interaction'], dfDict['Ahpscreening'], newly_enrolled_clients)
-    metrics.append({
-        'Metric': 'Number of newly enrolled clients connected to CBCC services within 30 days of referral',
-        'Value': num_connected_in_30_days,
-        'Description': 'Clients who were newly enrolled in the CCH and connected to CBCC services within 30 days of referral.'
-    })
-    metrics.append({
-        'Metric': 'Percent of individuals referred to the CCH who are enrolled in the CCH.',
-        'Value': calculate_enrollment_percentage(number_enrolled, inbound_referrals),
-        'Description': 'Percentage of individuals referred to the CCH who are enrolled in the CCH.'
-    })
-    metrics.append({
-        'Metric': 'Percent of enrolled clients from priority populations.',
-        'Value': calculate_priority_population_percentage(num_priority_population, number_enrolled),
-        'Description': 'Percentage of enrolled clients who are from priority populations.'
-    })
-    metrics.append({
-        'Metric': 'Percent of enrolled clients with an SDOH assessment.',
-        'Value': calculate_sdoh_assessment_percentage(num_with_sdoh_assessment, number_enrolled),
-        'Description': 'Enrolled clients who have completed an SDOH assessment.'
-    })
-    metrics.append({
-        'Metric': 'Percent of newly enrolled clients connected to CBCC services within 7 days of referral.',
-        'Value': calculate_percent_newly_enrolled_clients_connected_to_cbcc_7_days(num_connected_in_7_days, num_newly_enrolled),
-        'Description': 'Percentage of newly enrolled clients connected to CBCC services within 7 days of referral.'
-    })
-    metrics.append({
-        'Metric': 'Percent of newly enrolled clients connected to CBCC services within 30 days of referral.',
-        'Value': calculate_percent_newly_enrolled_clients_connected_to_cbcc_30_days(num_connected_in_30_days, num_newly_enrolled),
-        'Description': 'Percentage of newly enrolled clients connected to CBCC services within 30 days of referral.'
-    })
-    identified_needs_met = calculate_identified_client_needs_met(dfDict['Goalshortterm'], start_date, end_date)
-    metrics.append({
-        'Metric': 'Percent of identified client needs that were successfully met.',
-        'Value': identified_needs_met,
-        'Description': 'Percentage of identified client needs that were successfully met during the reporting period.'
-    })
-    discharged_clients = get_discharged_clients(dfDict['Interaction'], start_date, end_date)
-    metrics.append({
-        'Metric': 'Percent of Discharged Clients Reporting Improved Wellbeing',
-        'Value': calculate_discharged_clients_wellbeing_improvement(dfDict['Ahpscreening'], discharged_clients),
-        'Description': 'Percentage of discharged clients who reported improved wellbeing based on Cantrils Ladder scores.'
-    })
-    return pd.DataFrame(metrics)
\ No newline at end of file
+    rows = iter_metrics(dfDict, start_date, end_date, engine=engine, raise_errors=True)
+    return pd.DataFrame([{key: row[key] for key in ('Metric', 'Value', 'Description')} for row in rows])
@@ -0,0 +1,292 @@
+import pandas as pd
+import polars as pl
+
+from dates import parse_dates
+from metrics import (
+    ENROLLED_STATUSES,
+    SERVICES_PROVIDED,
+    METRIC1_DATE_COL, METRIC1_REFERRALTYPE_COL,
+    METRIC2_DATE_COL, METRIC2_CLIENTID_COL, METRIC2_REFERRALTYPE_COL, METRIC2_DUPLICATE_COL, METRIC2_DUPLICATE_VALUE,
+    METRIC3_CLIENTID_COL, METRIC3_DATE_COL, METRIC3_STATUS_COL, METRIC3_EDITSTAMP_COL,
+    METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL, METRIC4_CL1_COL, METRIC4_CL2_COL,
+    METRIC5_CLIENTID_COL, METRIC5_SDOH_DATE_COL,
+    METRIC6_CLIENTID_COL, METRIC6_STATUS_COL, METRIC6_STATUS_VALUES, METRIC6_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL,
+    METRIC7_CLIENTID_COL, METRIC7_TAXONOMY_COL, METRIC7_REFERRAL_DATE_COL,
+    METRIC8_CLIENTID_COL, METRIC8_REFERRAL_DATE_COL, METRIC8_OUTCOME_COL, METRIC8_INTERACTION_DATE_COL, METRIC8_SDOH_DATE_COL,
+)
+
+# Polars implementation of the metric definitions in metrics.py.
+# Every function here has the same name, arguments and return value as its pandas counterpart, but takes
+# polars LazyFrames (see prepare_data) so each metric is planned and executed as one optimized, multithreaded query.
+# metrics.py stays the reference implementation; any difference in output between the two is a bug in this module.
+
+# Settings
+# - Date columns parsed up front by prepare_data, using the same parser as the pandas metrics (dates.parse_dates).
+DATE_COLUMNS = [
+    METRIC1_DATE_COL,
+    METRIC3_EDITSTAMP_COL,
+    METRIC4_EDITSTAMP_COL,
+    METRIC5_SDOH_DATE_COL,
+    METRIC6_OPTIN_DATE_COL,
+    METRIC7_REFERRAL_DATE_COL,
+    METRIC8_REFERRAL_DATE_COL,
+    METRIC8_INTERACTION_DATE_COL,
+    'Ahpscreening_CreateStamp',
+    'GoalshorttermSystem_StgDateCreated',
+    'GoalshorttermSystem_StgDateCompleted',
+]
+
+
+def prepare_data(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    """
+    Convert a dictionary of pandas DataFrames into polars LazyFrames. The date range is applied by the metric functions.
+    Known date columns are parsed once here. Object columns holding a mix of value types (common in Excel exports)
+    must already be normalized (metrics.normalize_mixed_columns, as iter_metrics does), since a polars column has a
+    single type.
+    """
+    lazyDict = {}
+    # Date formats are inferred once per column for this call (see dates.parse_dates)
+    formats = {}
+    for name, df in dfDict.items():
+        df = df.assign(**{col: parse_dates(df[col], formats=formats).astype('datetime64[ns]') for col in df.columns if col in DATE_COLUMNS})
+        lazyDict[name] = pl.from_pandas(df).lazy()
+    return lazyDict
+
+
+def _columns(lf: pl.LazyFrame) -> list:
+    return lf.collect_schema().names()
+
+
+def _ts(value: pd.Timestamp) -> pl.Expr:
+    # Timestamp.min/max do not fit a python datetime, so pass the nanosecond value straight through.
+    return pl.lit(pd.Timestamp(value).value).cast(pl.Datetime('ns'))
+
+
+def _in_range(col: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pl.Expr:
+    return (pl.col(col) >= _ts(start_date)) & (pl.col(col) <= _ts(end_date))
+
+
+def _not_blank(col: str) -> pl.Expr:
+    # Same as pandas: notnull() & (astype(str).str.strip() != '')
+    return pl.col(col).is_not_null() & (pl.col(col).cast(pl.Utf8).str.strip_chars() != '')
+
+
+def _contains_any(col: str, values: list) -> pl.Expr:
+    # Case-insensitive substring match against any of values, as in the pandas status masks.
+    lowered = pl.col(col).cast(pl.Utf8).str.to_lowercase()
+    expr = pl.lit(False)
+    for value in values:
+        expr = expr | lowered.str.contains(value.lower(), literal=True).fill_null(False)
+    return expr
+
+
+def _isin(lf: pl.LazyFrame, col: str, ids: list) -> pl.Expr:
+    dtype = lf.collect_schema()[col]
+    return pl.col(col).is_in(pl.Series(ids).cast(dtype, strict=False).implode())
+
+
+def _first_digit(col: str) -> pl.Expr:
+    # Same as extract_first_digit
+    return pl.col(col).cast(pl.Utf8).str.extract(r'(\d+)', 1).cast(pl.Int64)
+
+
+def _wellbeing_rank(cl1: str, cl2: str) -> pl.Expr:
+    """
+    Rank of cantrils_ladder_category: Suffering=0, Struggling=1, Thriving=2, null for Unknown.
+    The pandas metrics store the extracted scores in a float column, so a single missing score is NaN rather than None
+    and falls through to Struggling; only a column with no scores at all comes out as Unknown. This mirrors that.
+    """
+    q1, q2 = pl.col(cl1), pl.col(cl2)
+    return (
+        pl.when(q1.is_null().all() | q2.is_null().all()).then(None)
+        .when((q1 >= 7) & (q2 >= 8)).then(2)
+        .when((q1 <= 4) & (q2 <= 4)).then(0)
+        .otherwise(1)
+    )
+
+
+# Metric #1
+def calculate_inbound_referrals(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> int:
+    if METRIC1_REFERRALTYPE_COL not in _columns(lf):
+        return 0
+    if METRIC1_DATE_COL in _columns(lf):
+        lf = lf.filter(_in_range(METRIC1_DATE_COL, start_date, end_date))
+    return lf.filter(_not_blank(METRIC1_REFERRALTYPE_COL)).select(pl.len()).collect().item()
+
+
+# Metric #2
+def calculate_unique_individuals_referred(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> int:
+    for col in [METRIC2_CLIENTID_COL, METRIC2_REFERRALTYPE_COL, METRIC2_DUPLICATE_COL]:
+        if col not in _columns(lf):
+            print(f'[DEBUG] Required column missing for Metric #2: {col}')
+            return 0
+    if METRIC2_DATE_COL in _columns(lf):
+        lf = lf.filter(_in_range(METRIC2_DATE_COL, start_date, end_date))
+    filtered = lf.filter(
+        _not_blank(METRIC2_REFERRALTYPE_COL) &
+        _not_blank(METRIC2_DUPLICATE_COL) &
+        (pl.col(METRIC2_DUPLICATE_COL).cast(pl.Utf8).str.strip_chars() != METRIC2_DUPLICATE_VALUE)
+    )
+    return filtered.select(pl.col(METRIC2_CLIENTID_COL).drop_nulls().n_unique()).collect().item()
+
+
+# Metric #3
+def calculate_enrolled_clients(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> tuple:
+    if any(col not in _columns(lf) for col in [METRIC3_CLIENTID_COL, METRIC3_STATUS_COL, METRIC3_EDITSTAMP_COL]):
+        return 0, []
+    if METRIC3_DATE_COL in _columns(lf):
+        lf = lf.filter(pl.col(METRIC3_DATE_COL) <= _ts(end_date))
+    earliest_status = (
+        lf.sort([METRIC3_CLIENTID_COL, METRIC3_EDITSTAMP_COL], nulls_last=True, maintain_order=True)
+        .unique(subset=[METRIC3_CLIENTID_COL], keep='first', maintain_order=True)
+    )
+    enrolled_clients = (
+        earliest_status.filter(_contains_any(METRIC3_STATUS_COL, ENROLLED_STATUSES))
+        .select(pl.col(METRIC3_CLIENTID_COL).unique(maintain_order=True))
+        .collect().to_series().to_list()
+    )
+    return len(enrolled_clients), enrolled_clients
+
+
+# Metric #4
+def calculate_enrolled_clients_priority_population(lf: pl.LazyFrame, listOfEnrolledClients: list) -> int:
+    if any(col not in _columns(lf) for col in [METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL, METRIC4_CL1_COL, METRIC4_CL2_COL]):
+        return 0
+    first_screenings = (
+        lf.filter(_isin(lf, METRIC4_CLIENTID_COL, listOfEnrolledClients) & _not_blank(METRIC4_CL1_COL) & _not_blank(METRIC4_CL2_COL))
+        .sort([METRIC4_CLIENTID_COL, METRIC4_EDITSTAMP_COL], nulls_last=True, maintain_order=True)
+        .unique(subset=[METRIC4_CLIENTID_COL], keep='first', maintain_order=True)
+        .with_columns(_first_digit(METRIC4_CL1_COL).alias('CL1_num'), _first_digit(METRIC4_CL2_COL).alias('CL2_num'))
+    )
+    rank = _wellbeing_rank('CL1_num', 'CL2_num')
+    return first_screenings.select(rank.is_in([0, 1]).sum()).collect().item()
+
+
+# Metric #5
+def calculate_enrolled_clients_with_sdoh_assessment(lf: pl.LazyFrame, listOfEnrolledClients: list) -> int:
+    if METRIC5_CLIENTID_COL not in _columns(lf) or METRIC5_SDOH_DATE_COL not in _columns(lf):
+        return 0
+    valid = lf.filter(_isin(lf, METRIC5_CLIENTID_COL, listOfEnrolledClients) & pl.col(METRIC5_SDOH_DATE_COL).is_not_null())
+    return valid.select(pl.col(METRIC5_CLIENTID_COL).drop_nulls().n_unique()).collect().item()
+
+
+# Metric #6
+def calculate_new_enrolled_clients(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> tuple:
+    if any(col not in _columns(lf) for col in [METRIC6_CLIENTID_COL, METRIC6_STATUS_COL, METRIC6_EDITSTAMP_COL, METRIC6_OPTIN_DATE_COL]):
+        return 0, []
+    latest_status = (
+        lf.filter(_in_range(METRIC6_OPTIN_DATE_COL, start_date, end_date))
+        .sort([METRIC6_CLIENTID_COL, METRIC6_EDITSTAMP_COL], descending=[False, True], nulls_last=True, maintain_order=True)
+        .unique(subset=[METRIC6_CLIENTID_COL], keep='first', maintain_order=True)
+    )
+    new_enrolled_clients = (
+        latest_status.filter(_contains_any(METRIC6_STATUS_COL, METRIC6_STATUS_VALUES))
+        .select(pl.col(METRIC6_CLIENTID_COL).unique(maintain_order=True))
+        .collect().to_series().to_list()
+    )
+    return len(new_enrolled_clients), new_enrolled_clients
+
+
+# Metric #7
+def calculate_outbound_referrals_type(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> dict:
+    if any(col not in _columns(lf) for col in [METRIC7_CLIENTID_COL, METRIC7_TAXONOMY_COL, METRIC7_REFERRAL_DATE_COL]):
+        return {}
+    category = (
+        pl.when(_not_blank(METRIC7_TAXONOMY_COL))
+        .then(pl.col(METRIC7_TAXONOMY_COL).cast(pl.Utf8).str.strip_chars())
+        .otherwise(pl.lit('Uncategorized'))
+    )
+    counts = (
+        lf.filter(_in_range(METRIC7_REFERRAL_DATE_COL, start_date, end_date) & _not_blank(METRIC7_CLIENTID_COL))
+        .group_by(category.alias('category'), maintain_order=True)
+        .len()
+        .collect()
+    )
+    return dict(zip(counts['category'].to_list(), counts['len'].to_list()))
+
+
+# Metric #8 and #9: time to connection
+# Whole days (floored, like timedelta.days) from referral to the earliest qualifying interaction or SDOH assessment,
+# never negative (see metrics.calculate_days_to_connection). #8/#9 are read off its distribution by metrics.iter_metrics.
+def calculate_days_to_connection(client_lf: pl.LazyFrame, interaction_lf: pl.LazyFrame, ahpscreening_lf: pl.LazyFrame, newly_enrolled_client_ids: list) -> pd.Series:
+    ids = pd.Index(pd.unique(pd.Series(newly_enrolled_client_ids, dtype=object)))
+    if ids.empty or METRIC8_CLIENTID_COL not in _columns(client_lf) or METRIC8_REFERRAL_DATE_COL not in _columns(client_lf):
+        return pd.Series(float('nan'), index=ids)
+    client_dtype = client_lf.collect_schema()[METRIC8_CLIENTID_COL]
+    referral_dates = (
+        client_lf.filter(_isin(client_lf, METRIC8_CLIENTID_COL, newly_enrolled_client_ids))
+        .group_by(METRIC8_CLIENTID_COL, maintain_order=True)
+        .agg(pl.col(METRIC8_REFERRAL_DATE_COL).last().alias('_referral_date'))
+    )
+    events = []
+    if all(col in _columns(interaction_lf) for col in [METRIC8_CLIENTID_COL, METRIC8_OUTCOME_COL, METRIC8_INTERACTION_DATE_COL]):
+        events.append(
+            interaction_lf.filter(pl.col(METRIC8_OUTCOME_COL).cast(pl.Utf8).is_in(SERVICES_PROVIDED))
+            .select(pl.col(METRIC8_CLIENTID_COL).cast(client_dtype, strict=False), pl.col(METRIC8_INTERACTION_DATE_COL).alias('_event'))
+        )
+    if all(col in _columns(ahpscreening_lf) for col in [METRIC8_CLIENTID_COL, METRIC8_SDOH_DATE_COL]):
+        events.append(
+            ahpscreening_lf.select(pl.col(METRIC8_CLIENTID_COL).cast(client_dtype, strict=False), pl.col(METRIC8_SDOH_DATE_COL).alias('_event'))
+        )
+    if not events:
+        return pd.Series(float('nan'), index=ids)
+    first_event = pl.concat(events).group_by(METRIC8_CLIENTID_COL).agg(pl.col('_event').min())
+    days = (
+        referral_dates.join(first_event, on=METRIC8_CLIENTID_COL, how='left')
+        .select(METRIC8_CLIENTID_COL, ((pl.col('_event') - pl.col('_referral_date')).dt.total_nanoseconds() // 86_400_000_000_000).clip(lower_bound=0).alias('days'))
+        .collect()
+    )
+    return pd.Series(days['days'].to_list(), index=days[METRIC8_CLIENTID_COL].to_list(), dtype=float).reindex(ids)
+
+
+# Metric #15
+def calculate_identified_client_needs_met(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> float:
+    required_cols = ['Goalshortterm_Status', 'GoalshorttermOption_GoalClosureStatus', 'GoalshorttermSystem_StgDateCreated', 'GoalshorttermSystem_StgDateCompleted']
+    if any(col not in _columns(lf) for col in required_cols):
+        print("[DEBUG] Required columns missing!")
+        return 0.0
+    total, met = (
+        lf.filter(_in_range('GoalshorttermSystem_StgDateCreated', start_date, end_date))
+        .select(pl.len(), _contains_any('GoalshorttermOption_GoalClosureStatus', ['Met', 'Partially Met']).sum())
+        .collect().row(0)
+    )
+    if total == 0:
+        return 0.0
+    return (met / total) * 100
+
+
+# Helper function: clients discharged during the date range
+def get_discharged_clients(lf: pl.LazyFrame, start_date: pd.Timestamp, end_date: pd.Timestamp) -> list:
+    if any(col not in _columns(lf) for col in ['Client_Id', 'InteractionOption_ContactOutcome', 'Interaction_CreateStamp']):
+        return []
+    return (
+        lf.filter(_contains_any('InteractionOption_ContactOutcome', ['discharged']) & _in_range('Interaction_CreateStamp', start_date, end_date))
+        .select(pl.col('Client_Id').drop_nulls().unique(maintain_order=True))
+        .collect().to_series().to_list()
+    )
+
+
+# Metric #16
+def calculate_discharged_clients_wellbeing_improvement(lf: pl.LazyFrame, discharged_clients: list) -> float:
+    if not discharged_clients:
+        return 0.0
+    cl1, cl2 = 'AhpscreeningOption_WellbeingCantrilsLadder1', 'AhpscreeningOption_WellbeingCantrilsLadder2'
+    for col in ['Client_Id', 'Ahpscreening_CreateStamp', cl1, cl2]:
+        if col not in _columns(lf):
+            print(f"[DEBUG] Required column missing: {col}")
+            return 0.0
+    per_client = (
+        lf.filter(_isin(lf, 'Client_Id', discharged_clients) & _not_blank(cl1) & _not_blank(cl2))
+        .with_columns(_first_digit(cl1).alias('CL1_num'), _first_digit(cl2).alias('CL2_num'))
+        .with_columns(_wellbeing_rank('CL1_num', 'CL2_num').alias('_rank'))
+        .sort(['Client_Id', 'Ahpscreening_CreateStamp'], nulls_last=True, maintain_order=True)
+        .group_by('Client_Id')
+        .agg(pl.col('_rank').first().alias('intake'), pl.col('_rank').last().alias('discharge'))
+        .filter(pl.col('intake').is_not_null() & pl.col('discharge').is_not_null())
+    )
+    total_count, improved_count = (
+        per_client.select(pl.len(), (pl.col('discharge') > pl.col('intake')).sum()).collect().row(0)
+    )
+    if total_count == 0:
+        return 0.0
+    return (improved_count / total_count) * 100
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from client_partitions import client_hash
+from metrics import (
+    DEFAULT_ENGINE,
+    METRIC2_SHEET,
+    METRIC2_CLIENTID_COL,
+    METRIC7_SHEET,
+    METRIC7_CLIENTID_COL,
+    METRIC8_INTERACTION_SHEET,
+    METRIC8_AHPSCREENING_SHEET,
+    calculate_all_metrics,
+)
+
+# Approximate preview on a client sample.
+# Every relevant sheet is cut down to the rows of a fixed-size random sample of clients, chosen by Client_Id hash, so
+# each sampled client keeps all of its rows in every sheet and the per-client logic (#3 first screening, #8/#9
+# referral to connection, #16 first vs. last wellbeing) sees the same history it would in a full run.
+# Count metrics are scaled up by the sampling fraction; percentages and medians are reported as measured.
+# Error bounds come from random groups: the sample is split into PREVIEW_GROUPS disjoint client groups, the metrics
+# are recomputed on each, and the spread of the group estimates gives the standard error of the preview value.
+
+# Settings
+# - Number of clients sampled for a preview. Exports with fewer clients are previewed exactly.
+PREVIEW_MAX_CLIENTS = 2000
+# - Sheets sampled by client, and their client ID column. Sheets without a client column (Goalshortterm) are
+#   sampled by row; every other sheet is kept whole.
+PREVIEW_CLIENT_COLUMNS = {
+    METRIC2_SHEET: METRIC2_CLIENTID_COL,
+    METRIC8_AHPSCREENING_SHEET: METRIC2_CLIENTID_COL,
+    'Ahpdischarge': METRIC2_CLIENTID_COL,
+    METRIC8_INTERACTION_SHEET: METRIC2_CLIENTID_COL,
+    METRIC7_SHEET: METRIC7_CLIENTID_COL,
+}
+# - Number of random client groups used to estimate the error bounds.
+PREVIEW_GROUPS = 10
+# - Critical value for the error bounds: 95% two-sided t quantile with PREVIEW_GROUPS - 1 degrees of freedom.
+PREVIEW_CRITICAL_VALUE = 2.262
+# - Metrics whose title starts with this are counts, and are scaled up by the sampling fraction.
+PREVIEW_COUNT_PREFIX = 'Number of'
+# - Hash buckets used to turn the sampling fraction into a hash threshold.
+PREVIEW_HASH_BUCKETS = 1 << 20
+
+
+def sample_clients(dfDict: dict, max_clients: int = PREVIEW_MAX_CLIENTS) -> tuple:
+    """
+    Cut each sheet in dfDict down to about max_clients clients, keeping all rows of every sampled client.
+    Returns (sampled dfDict, sampling fraction, per-row group number for each sampled sheet).
+    The fraction is the realised share of Client sheet clients that were sampled (1.0 when nothing was cut).
+    """
+    client_df = dfDict[METRIC2_SHEET]
+    if METRIC2_CLIENTID_COL not in client_df.columns:
+        return dfDict, 1.0, {}
+    ids = client_df[METRIC2_CLIENTID_COL].dropna().drop_duplicates()
+    target = min(1.0, max_clients / len(ids)) if len(ids) else 1.0
+    threshold = int(target * PREVIEW_HASH_BUCKETS)
+    sampled = {}
+    groups = {}
+    for name, df in dfDict.items():
+        if name in PREVIEW_CLIENT_COLUMNS and PREVIEW_CLIENT_COLUMNS[name] in df.columns:
+            hashes = client_hash(df[PREVIEW_CLIENT_COLUMNS[name]])
+        elif name not in PREVIEW_CLIENT_COLUMNS:
+            # No client column: rows are independent, so sample them by position
+            hashes = client_hash(pd.Series(np.arange(len(df)), index=df.index))
+        else:
+            sampled[name] = df
+            continue
+        keep = (hashes % PREVIEW_HASH_BUCKETS) < threshold
+        sampled[name] = df[keep]
+        # Group from the high bits, independent of the sampling decision
+        groups[name] = (hashes[keep] >> 32) % PREVIEW_GROUPS
+    fraction = sampled[METRIC2_SHEET][METRIC2_CLIENTID_COL].dropna().nunique() / len(ids) if len(ids) else 1.0
+    return sampled, fraction, groups
+
+
+def preview_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, engine: str = DEFAULT_ENGINE, max_clients: int = PREVIEW_MAX_CLIENTS) -> pd.DataFrame:
+    """
+    Estimate all metrics from a client sample (see sample_clients).
+    Returns the calculate_all_metrics table with extra columns Lower and Upper (95% error bounds) and
+    Approximate (False when the export was small enough to preview exactly).
+    """
+    sampled, fraction, groups = sample_clients(dfDict, max_clients)
+    preview = calculate_all_metrics(sampled, start_date, end_date, engine=engine)
+    is_count = preview['Metric'].str.startswith(PREVIEW_COUNT_PREFIX)
+    if fraction >= 1.0:
+        print("[DEBUG] Preview covers every client; values are exact")
+        return preview.assign(Lower=preview['Value'], Upper=preview['Value'], Approximate=False)
+    print(f"[DEBUG] Preview on {fraction:.1%} of clients")
+    preview.loc[is_count, 'Value'] = preview.loc[is_count, 'Value'] / fraction
+    # Random-group estimates, each scaled by its own share of the clients
+    group_values = []
+    for number in range(PREVIEW_GROUPS):
+        group = {name: df[groups[name] == number] if name in groups else df for name, df in sampled.items()}
+        group_fraction = fraction * group[METRIC2_SHEET][METRIC2_CLIENTID_COL].dropna().nunique() / max(sampled[METRIC2_SHEET][METRIC2_CLIENTID_COL].dropna().nunique(), 1)
+        values = calculate_all_metrics(group, start_date, end_date, engine=engine).set_index('Metric')['Value']
+        values = values.reindex(preview['Metric']).to_numpy(dtype=float)
+        values = np.where(is_count, np.nan_to_num(values) / max(group_fraction, 1e-12), values)
+        group_values.append(values)
+    group_values = np.array(group_values)
+    valid = np.sum(~np.isnan(group_values), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = np.nanstd(group_values, axis=0, ddof=1) / np.sqrt(valid)
+    # Finite population correction: the bounds shrink to zero as the sample approaches the whole export
+    margin = PREVIEW_CRITICAL_VALUE * spread * np.sqrt(1 - fraction)
+    return preview.assign(Lower=preview['Value'] - margin, Upper=preview['Value'] + margin, Approximate=True)
@@ -0,0 +1,123 @@
+import asyncio
+import csv
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from metrics import DEFAULT_ENGINE, iter_metrics
+
+# Incremental report output.
+# The writers consume metric rows (from metrics.iter_metrics or aiter_metrics) and append each one to the output file
+# as it arrives, flushing after every row, so a long run shows progress on disk and a crash or a failing metric late
+# in the report still leaves every earlier row in the file.
+#
+# Usage:
+#   rows = iter_metrics(dfDict, start_date, end_date, engine='polars')
+#   write_metrics_csv(rows, 'report.csv')
+# or, from async code:
+#   async for row in aiter_metrics(dfDict, start_date, end_date): ...
+
+# Settings
+# - Columns written to CSV reports: the columns calculate_all_metrics returns, plus the status, so a failed metric's
+#   error stays in the report next to its empty value.
+CSV_REPORT_COLUMNS = ['Metric', 'Value', 'Description', 'Status']
+# - Keys written per row to JSON Lines reports, which also carry the per-metric timing and status.
+JSON_REPORT_KEYS = ['Metric', 'Value', 'Description', 'Seconds', 'Status']
+
+
+async def aiter_metrics(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, engine: str = DEFAULT_ENGINE):
+    """
+    Async iterator over the same rows as metrics.iter_metrics.
+    Each metric is computed in a worker thread, so the event loop stays responsive between rows.
+    """
+    rows = iter_metrics(dfDict, start_date, end_date, engine=engine)
+    while True:
+        row = await asyncio.to_thread(next, rows, None)
+        if row is None:
+            return
+        yield row
+
+
+def write_metrics_csv(rows, path: str, columns: list = CSV_REPORT_COLUMNS) -> list:
+    """
+    Write metric rows to a CSV file as they arrive, header first.
+    Returns the rows written.
+    """
+    written = []
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        f.flush()
+        for row in rows:
+            writer.writerow({key: _plain(value) for key, value in row.items()})
+            f.flush()
+            written.append(row)
+    return written
+
+
+def write_metrics_jsonl(rows, path: str, keys: list = JSON_REPORT_KEYS) -> list:
+    """
+    Write metric rows to a JSON Lines file (one JSON object per line) as they arrive.
+    Returns the rows written.
+    """
+    written = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps({key: _plain(row.get(key)) for key in keys}) + '\n')
+            f.flush()
+            written.append(row)
+    return written
+
+
+def write_metrics_json(rows, path: str, keys: list = JSON_REPORT_KEYS) -> list:
+    """
+    Write metric rows to a JSON file holding one array of objects, appending each row as it arrives.
+    The file is only valid JSON once the closing bracket is written after the last row; use write_metrics_jsonl for
+    output that can be read while the report is still running.
+    Returns the rows written.
+    """
+    written = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for row in rows:
+            f.write((',\n' if written else '\n') + json.dumps({key: _plain(row.get(key)) for key in keys}))
+            f.flush()
+            written.append(row)
+        f.write('\n]\n')
+    return written
+
+
+def stream_report(dfDict: dict, start_date: pd.Timestamp, end_date: pd.Timestamp, path: str, engine: str = DEFAULT_ENGINE) -> list:
+    """
+    Compute all metrics and write them to path as they are computed: JSON Lines for a .jsonl path, a JSON array for
+    a .json path, CSV otherwise. Failing metrics are written with an empty value and
+    their error in Status. Returns the rows, including Seconds
+    and Status.
+    """
+    rows = _log_rows(iter_metrics(dfDict, start_date, end_date, engine=engine))
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.jsonl':
+        return write_metrics_jsonl(rows, path)
+    if extension == '.json':
+        return write_metrics_json(rows, path)
+    return write_metrics_csv(rows, path)
+
+
+def _log_rows(rows):
+    for row in rows:
+        print(f"[DEBUG] {row['Status']} in {row['Seconds']:.2f}s: {row['Metric']} = {row['Value']}")
+        yield row
+
+
+def _plain(value):
+    """
+    Convert numpy scalars to Python values and NaN to None, so they serialize to CSV/JSON cleanly.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+
+from metrics import DEFAULT_ENGINE, calculate_all_metrics, normalize_mixed_columns
+
+# Shared, read-only dataset for multi-process metric workers.
+# Handing the sheets to a process pool as arguments pickles every DataFrame into every worker, which costs more than
+# the metrics themselves. Instead the parent publishes the sheets once as uncompressed Arrow IPC files, and each
+# worker memory-maps them: the operating system shares the same pages between all processes, and the DataFrames a
+# worker sees are arrow-backed views over those pages rather than copies. Only the directory path crosses the
+# process boundary.
+#
+# Usage for any parallel path over calculate_all_metrics or the individual metric functions:
+#   path = publish_dataset(dfDict)
+#   with POOL_CONTEXT.Pool(initializer=init_worker, initargs=(path,)) as pool:
+#       ... tasks call worker_dataset() to get the sheets ...
+#   release_dataset(path)
+
+# Settings
+# - Where published datasets are written. /dev/shm is memory-backed on Linux, so the files never go to disk;
+#   elsewhere the system temp directory is used and the page cache plays the same role.
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+# - Process start method for worker pools. Forking a process that has already run multithreaded code (the polars
+#   engine, pyarrow) can deadlock the child, so workers are always spawned; they attach to the data anyway.
+POOL_CONTEXT = multiprocessing.get_context('spawn')
+# - Index file listing the published sheets, in order.
+SHARED_MANIFEST_FILE = 'sheets.json'
+
+# Sheets attached by init_worker in the current worker process.
+_worker_sheets = None
+
+
+def publish_dataset(dfDict: dict) -> str:
+    """
+    Write each sheet in dfDict as an Arrow IPC file in a new shared directory.
+    Returns the directory path, which is all a worker needs to attach; call release_dataset when done.
+    """
+    path = tempfile.mkdtemp(prefix='cms_metrics_', dir=SHARED_DIR)
+    for name, df in dfDict.items():
+        table = pa.Table.from_pandas(normalize_mixed_columns(df), preserve_index=False)
+        with pa.OSFile(os.path.join(path, f'{name}.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    with open(os.path.join(path, SHARED_MANIFEST_FILE), 'w') as f:
+        json.dump(list(dfDict), f)
+    return path
+
+
+def attach_dataset(path: str) -> dict:
+    """
+    Memory-map a dataset written by publish_dataset and return its sheets as a dictionary of DataFrames.
+    Columns are arrow-backed (pd.ArrowDtype) views over the mapped files, so no sheet data is copied into the process.
+    The frames must be treated as read-only; assigning a column replaces it in this process only.
+    """
+    with open(os.path.join(path, SHARED_MANIFEST_FILE)) as f:
+        names = json.load(f)
+    dfDict = {}
+    for name in names:
+        source = pa.memory_map(os.path.join(path, f'{name}.arrow'), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        dfDict[name] = table.to_pandas(types_mapper=pd.ArrowDtype)
+    return dfDict
+
+
+def release_dataset(path: str) -> None:
+    """
+    Delete a dataset written by publish_dataset. Workers that still have it mapped keep working until they exit.
+    """
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def init_worker(path: str) -> None:
+    """
+    Pool initializer: attach the shared dataset once per worker process.
+    """
+    global _worker_sheets
+    _worker_sheets = attach_dataset(path)
+
+
+def worker_dataset() -> dict:
+    """
+    Returns the sheets attached by init_worker, as shallow copies so a task's column assignments
+    (the metric functions parse dates in place) do not leak into the next task run by the same worker.
+    Raises RuntimeError when called outside a worker started with init_worker.
+    """
+    if _worker_sheets is None:
+        raise RuntimeError("No shared dataset attached; start the worker pool with initializer=init_worker.")
+    return {name: df.copy(deep=False) for name, df in _worker_sheets.items()}
+
+
+def calculate_all_metrics_for_ranges(dfDict: dict, date_ranges: list, engine: str = DEFAULT_ENGINE, processes: int | None = None) -> list:
+    """
+    Calculate all metrics for each (start_date, end_date) in date_ranges, e.g. every month of a year, in parallel.
+    The sheets are published once and shared by all workers.
+    Returns a list of metric DataFrames in the same order as date_ranges.
+    """
+    path = publish_dataset(dfDict)
+    try:
+        with POOL_CONTEXT.Pool(processes, initializer=init_worker, initargs=(path,)) as pool:
+            return pool.starmap(_calculate_range, [(start_date, end_date, engine) for start_date, end_date in date_ranges])
+    finally:
+        release_dataset(path)
+
+
+def _calculate_range(start_date: pd.Timestamp, end_date: pd.Timestamp, engine: str) -> pd.DataFrame:
+    return calculate_all_metrics(worker_dataset(), start_date, end_date, engine=engine)
@@ -0,0 +1,54 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import ENGINES, calculate_all_metrics  # noqa: E402
+from synthetic import make_export  # noqa: E402
+
+# Benchmark of the metric engines on a large synthetic export.
+# Usage: python tests/benchmark_engines.py [--clients 20000] [--interactions 400000] [--engines pandas polars fused]
+
+
+def time_engine(export: dict, engine: str, start_date: pd.Timestamp, end_date: pd.Timestamp, repeat: int) -> float:
+    """
+    Best wall-clock time in seconds of calculate_all_metrics over repeat runs, each on a fresh copy of the sheets.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        sheets = {name: df.copy() for name, df in export.items()}
+        started = time.perf_counter()
+        # The metrics print [DEBUG] lines; keep them out of the timings table
+        with contextlib.redirect_stdout(io.StringIO()):
+            calculate_all_metrics(sheets, start_date, end_date, engine=engine)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time calculate_all_metrics per engine on a synthetic export.')
+    parser.add_argument('--clients', type=int, default=20_000)
+    parser.add_argument('--interactions', type=int, default=400_000)
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--start', default='2023-01-01')
+    parser.add_argument('--end', default='2023-12-31')
+    args = parser.parse_args()
+    export = make_export(args.clients, args.interactions, seed=1)
+    rows = sum(len(df) for df in export.values())
+    print(f"Synthetic export: {args.clients} clients, {rows} rows")
+    baseline = None
+    for engine in args.engines:
+        seconds = time_engine(export, engine, pd.Timestamp(args.start), pd.Timestamp(args.end), args.repeat)
+        baseline = seconds if baseline is None else baseline
+        print(f"{engine:>8}: {seconds:8.2f}s  ({baseline / seconds:.1f}x vs {args.engines[0]})")
+
+
+if __name__ == '__main__':
+    main()
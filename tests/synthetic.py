@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic exports for the engine tests and benchmark.
+# make_export builds the six RELEVANT_SHEETS with the columns the metrics read, with the kinds of mess the real
+# exports have: repeated client rows, blank and missing values, list-like Cantril's Ladder answers, missing dates,
+# referrals without a client, and events dated before the client's referral.
+
+
+def make_export(n_clients: int = 300, n_interactions: int = 3000, seed: int = 0, as_excel: bool = False) -> dict:
+    """
+    Returns a dictionary of DataFrames shaped like a loaded export.
+    With as_excel=True every column is an object column, as read_excel leaves columns holding mixed values.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_clients + 1)
+    days = pd.date_range('2022-06-01', '2024-06-01')
+
+    def dates(n):
+        values = pd.Series(rng.choice(days, n))
+        values[rng.random(n) < 0.05] = pd.NaT
+        return values
+
+    client_rows = np.repeat(ids, rng.integers(1, 4, n_clients))
+    n = len(client_rows)
+    client = pd.DataFrame({
+        'Client_Id': client_rows,
+        'Client_CreateStamp': dates(n),
+        'Client_EditStamp': dates(n),
+        'ClientOption_WhatTypeOfReferralIsThis': rng.choice(['Self', 'Provider', None, ''], n),
+        'ClientOption_AhpClientStatus': rng.choice(['Active', 'Inactive', 'Inactive-Duplicate Record', 'New', None], n),
+        'ClientOption_CareConnectStatus': rng.choice(['Engaged', 'Enrolled (Assigned)', 'Outreach', 'Referral'], n),
+        'ClientSystem_CcOptinDate': dates(n),
+        'ClientSystem_CcProgramReferralDate': dates(n),
+    })
+    m = n_clients * 2
+    ahpscreening = pd.DataFrame({
+        'Client_Id': rng.choice(ids, m),
+        'Ahpscreening_EditStamp': dates(m),
+        'Ahpscreening_CreateStamp': dates(m),
+        'AhpscreeningOption_WellbeingCantrilsLadder1': rng.choice(['["3"]', '7', '9 - great', None, ''], m),
+        'AhpscreeningOption_WellbeingCantrilsLadder2': rng.choice(['["2"]', '8', '4', None], m),
+        'AhpscreeningSystem_DateAcceptedcompleted': dates(m),
+    })
+    interaction = pd.DataFrame({
+        'Client_Id': rng.choice(ids, n_interactions),
+        'Interaction_CreateStamp': dates(n_interactions),
+        'InteractionOption_ContactOutcome': rng.choice(['Care Coordination', 'Referral to Services', 'No Answer', 'Discharged - Goals met', 'Left message'], n_interactions),
+    })
+    k = n_interactions // 3
+    interaction_referral = pd.DataFrame({
+        'InteractionReferral_ReferralsModule_client_id': rng.choice(list(ids) + [None], k),
+        'InteractionReferralTaxonomy_Taxonomy_external_term_name': rng.choice(['Food', 'Housing', None, ''], k),
+        'InteractionReferral_ReferralsModule_referral_status_requested_date': dates(k),
+    })
+    goalshortterm = pd.DataFrame({
+        'Goalshortterm_Status': rng.choice(['Open', 'Closed'], n_clients),
+        'GoalshorttermOption_GoalClosureStatus': rng.choice(['Met', 'Partially Met', 'Not Met', None], n_clients),
+        'GoalshorttermSystem_StgDateCreated': dates(n_clients),
+        'GoalshorttermSystem_StgDateCompleted': dates(n_clients),
+    })
+    ahpdischarge = pd.DataFrame({'Client_Id': ids[:10], 'Ahpdischarge_CreateStamp': dates(min(10, n_clients))})
+    export = {
+        'Client': client,
+        'Ahpscreening': ahpscreening,
+        'Goalshortterm': goalshortterm,
+        'Ahpdischarge': ahpdischarge,
+        'Interaction': interaction,
+        'Interaction_referral': interaction_referral,
+    }
+    if as_excel:
+        export = {name: df.astype(object).where(df.notna(), None) for name, df in export.items()}
+    return export
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from breakdowns import BLANK_GROUP, TOTAL_GROUP, calculate_grouped_metrics
+from metrics import calculate_all_metrics
+from synthetic import make_export
+
+# Each group of a breakdown must report what a full run on that group's clients reports: the grouped pass splits
+# per-client intermediates instead of re-running the metrics, so this is checked against calculate_all_metrics on
+# the export filtered by hand.
+
+START, END = pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')
+REFERRAL_SHEET = 'Interaction_referral'
+REFERRAL_CLIENT = 'InteractionReferral_ReferralsModule_client_id'
+TAXONOMY = 'InteractionReferralTaxonomy_Taxonomy_external_term_name'
+
+
+def _label(values: pd.Series) -> pd.Series:
+    labels = values.astype(object).where(values.notna(), '').astype(str).str.strip()
+    return labels.mask(labels == '', BLANK_GROUP)
+
+
+def _filtered(export: dict, clients: set, referral_rows: pd.Series | None = None) -> dict:
+    sheets = {}
+    for name, df in export.items():
+        if name == REFERRAL_SHEET:
+            rows = df[REFERRAL_CLIENT].isin(clients) if referral_rows is None else referral_rows
+            sheets[name] = df[rows]
+        elif 'Client_Id' in df.columns:
+            sheets[name] = df[df['Client_Id'].isin(clients)]
+        else:
+            sheets[name] = df.iloc[0:0]
+    return sheets
+
+
+def _assert_group(table: pd.DataFrame, dimension: str, group: str, sheets: dict):
+    actual = table[table[dimension] == group].reset_index(drop=True)
+    expected = calculate_all_metrics(sheets, START, END)
+    assert actual['Metric'].tolist() == expected['Metric'].tolist(), group
+    grouped = ~expected['Metric'].isin(['Percent of identified client needs that were successfully met.'])
+    pd.testing.assert_series_equal(actual.loc[grouped, 'Value'].astype(float), expected.loc[grouped, 'Value'].astype(float), check_names=False, obj=group)
+
+
+def test_client_level_groups_match_filtered_runs():
+    export = make_export(n_clients=300, n_interactions=3000, seed=3)
+    table = calculate_grouped_metrics({name: df.copy() for name, df in export.items()}, START, END, ['AHP client status'])
+    last = export['Client'].drop_duplicates('Client_Id', keep='last')
+    status = pd.Series(_label(last['ClientOption_AhpClientStatus']).to_numpy(), index=last['Client_Id'])
+    assert table.loc[table['AHP client status'] == TOTAL_GROUP, 'Metric'].tolist() == calculate_all_metrics(export, START, END)['Metric'].tolist()
+    for group in ['Active', 'Inactive', BLANK_GROUP]:
+        _assert_group(table, 'AHP client status', group, _filtered(export, set(status.index[status == group])))
+
+
+def test_referral_level_groups_match_filtered_runs():
+    export = make_export(n_clients=300, n_interactions=3000, seed=4)
+    table = calculate_grouped_metrics({name: df.copy() for name, df in export.items()}, START, END, ['HRSN taxonomy'], include_total=False)
+    referrals = export[REFERRAL_SHEET]
+    labels = _label(referrals[TAXONOMY])
+    # Clients without any referral are in the blank group too
+    unreferred = set(pd.concat([df['Client_Id'] for df in export.values() if 'Client_Id' in df.columns])) - set(referrals[REFERRAL_CLIENT])
+    for group in sorted(labels.unique()):
+        rows = labels == group
+        clients = set(referrals.loc[rows, REFERRAL_CLIENT]) | (unreferred if group == BLANK_GROUP else set())
+        _assert_group(table, 'HRSN taxonomy', group, _filtered(export, clients, rows))
+
+
+def test_dimensions_are_required():
+    with pytest.raises(ValueError, match='At least one dimension'):
+        calculate_grouped_metrics(make_export(), START, END, [])
+    with pytest.raises(ValueError, match='Unknown group dimension'):
+        calculate_grouped_metrics(make_export(), START, END, ['Zip code'])
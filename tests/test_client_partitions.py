@@ -0,0 +1,28 @@
+import pandas as pd
+
+from client_partitions import client_hash, client_partition
+from synthetic import make_export
+
+# Sampling, breakdowns and drill-down chunks rely on a client hashing to the same value in every sheet, whatever
+# dtype the sheet stores its ids in.
+
+
+def test_hash_agrees_across_id_dtypes():
+    ints = pd.Series([12, 7, 40000])
+    floats = pd.Series([12.0, 7.0, 40000.0, None])
+    text = pd.Series(['12', '7', '40000', None], dtype=object)
+    assert (client_hash(ints) == client_hash(floats)[:3]).all()
+    assert (client_hash(ints) == client_hash(text)[:3]).all()
+
+
+def test_partitions_keep_each_client_together():
+    export = make_export(n_clients=200, n_interactions=2000, seed=12)
+    seen = {}
+    for name in ['Client', 'Interaction', 'Ahpscreening']:
+        ids = export[name]['Client_Id']
+        for client_id, number in zip(ids, client_partition(ids, 3)):
+            assert seen.setdefault(client_id, number) == number, (name, client_id)
+    referrals = export['Interaction_referral']['InteractionReferral_ReferralsModule_client_id']
+    for client_id, number in zip(referrals, client_partition(referrals, 3)):
+        if client_id is not None and client_id in seen:
+            assert seen[client_id] == number, ('Interaction_referral', client_id)
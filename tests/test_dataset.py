@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dataset import (
+    INTERACTION_LOOKBACK_NAME,
+    MANIFEST_FILE,
+    UNKNOWN_PARTITION,
+    build_interaction_lookback,
+    compile_dataset,
+    load_dataset,
+    select_partitions,
+)
+from metrics import calculate_all_metrics
+from synthetic import make_export
+
+# A compiled dataset must report what the full export reports for any date range, while reading only the month
+# partitions that overlap the range (plus the unpartitioned sheets and the Interaction lookback).
+
+DATE_RANGES = [
+    pytest.param('2023-03-01', '2023-03-31', id='one-month'),
+    pytest.param('2023-02-10', '2023-05-20', id='across-months'),
+]
+
+
+@pytest.fixture(scope='module')
+def export() -> dict:
+    return make_export(n_clients=300, n_interactions=3000, seed=8)
+
+
+@pytest.fixture(scope='module')
+def dataset_path(export, tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp('dataset'))
+    compile_dataset({name: df.copy() for name, df in export.items()}, path)
+    return path
+
+
+def _read_files(monkeypatch, dataset_path: str) -> list:
+    # Records every parquet file read, relative to the dataset root
+    read, read_parquet = [], pd.read_parquet
+
+    def spy(path, *args, **kwargs):
+        read.append(os.path.relpath(path, dataset_path))
+        return read_parquet(path, *args, **kwargs)
+    monkeypatch.setattr(pd, 'read_parquet', spy)
+    return read
+
+
+@pytest.mark.parametrize('start, end', DATE_RANGES)
+def test_loaded_range_matches_full_export(export, dataset_path, monkeypatch, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    read = _read_files(monkeypatch, dataset_path)
+    loaded = load_dataset(dataset_path, start, end)
+    months = pd.period_range(start, end, freq='M').strftime('%Y-%m').tolist()
+    partitioned = sorted(path for path in read if os.sep in path)
+    assert partitioned == sorted(os.path.join(name, f'{month}.parquet') for name in ['Interaction', 'Interaction_referral', 'Goalshortterm'] for month in months)
+    assert f'{INTERACTION_LOOKBACK_NAME}.parquet' in read
+    expected = calculate_all_metrics({name: df.copy() for name, df in export.items()}, start, end)
+    actual = calculate_all_metrics(loaded, start, end)
+    assert actual['Metric'].tolist() == expected['Metric'].tolist()
+    pd.testing.assert_series_equal(actual['Value'].astype(float), expected['Value'].astype(float), check_names=False)
+
+
+def test_interaction_lookback_covers_unloaded_months(export, dataset_path):
+    # A client's earliest qualifying interaction can lie in a month the range does not load; #8/#9 still see it
+    start, end = pd.Timestamp('2023-03-01'), pd.Timestamp('2023-03-31')
+    lookback = build_interaction_lookback(export['Interaction'])
+    assert lookback['Client_Id'].is_unique
+    assert lookback['InteractionOption_ContactOutcome'].isin(['Care Coordination', 'Referral to Services']).all()
+    services = export['Interaction'][export['Interaction']['InteractionOption_ContactOutcome'].isin(['Care Coordination', 'Referral to Services'])]
+    earliest = services.groupby('Client_Id')['Interaction_CreateStamp'].min()
+    assert lookback.set_index('Client_Id')['Interaction_CreateStamp'].sort_index().equals(earliest.dropna().sort_index().rename('Interaction_CreateStamp'))
+    interaction = load_dataset(dataset_path, start, end)['Interaction']
+    before_range = interaction[interaction['Interaction_CreateStamp'] < start]
+    assert not before_range.empty
+    assert set(before_range['Client_Id']) <= set(lookback['Client_Id'])
+
+
+def test_select_partitions():
+    partitions = ['2023-01', '2023-02', '2023-03', '2024-01', UNKNOWN_PARTITION]
+    assert select_partitions(partitions, pd.Timestamp('2023-02-15'), pd.Timestamp('2023-03-01')) == ['2023-02', '2023-03']
+    assert select_partitions(partitions, pd.Timestamp('2023-06-01'), pd.Timestamp('2023-06-30')) == []
+    assert select_partitions(partitions, pd.Timestamp.min, pd.Timestamp.max) == partitions[:-1]
+
+
+def test_range_without_partitions_keeps_the_columns(export, dataset_path):
+    assert os.path.isfile(os.path.join(dataset_path, MANIFEST_FILE))
+    loaded = load_dataset(dataset_path, pd.Timestamp('2030-01-01'), pd.Timestamp('2030-12-31'))
+    assert set(loaded) == set(export)
+    for name in ['Interaction_referral', 'Goalshortterm']:
+        assert loaded[name].empty
+        assert list(loaded[name].columns) == list(export[name].columns)
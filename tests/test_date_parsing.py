@@ -0,0 +1,38 @@
+import pandas as pd
+
+from dates import parse_dates, parse_sheet_dates
+from metrics import SHEET_DATE_COLUMNS
+
+# Date formats are inferred once per load or prepare_data call, into a cache the caller owns; nothing is kept between
+# calls, so a second export with the same column names gets its own formats.
+
+COLUMN = 'Interaction_CreateStamp'
+
+
+def _export(values: list) -> dict:
+    return {'Interaction': pd.DataFrame({'Client_Id': range(len(values)), COLUMN: values})}
+
+
+def test_each_load_infers_its_own_format():
+    first_formats, second_formats = {}, {}
+    first = parse_sheet_dates(_export(['06/10/2023 09:15 AM', '07/01/2023 02:30 PM']), SHEET_DATE_COLUMNS, formats=first_formats)
+    second = parse_sheet_dates(_export(['2023-06-10', '2023-07-01']), SHEET_DATE_COLUMNS, formats=second_formats)
+    assert first_formats == {COLUMN: '%m/%d/%Y %I:%M %p'}
+    assert second_formats == {COLUMN: 'ISO8601'}
+    expected = pd.to_datetime(['2023-06-10', '2023-07-01'])
+    assert (first['Interaction'][COLUMN].dt.normalize() == expected).all()
+    assert (second['Interaction'][COLUMN] == expected).all()
+
+
+def test_cache_is_shared_within_one_call_and_failures_are_counted():
+    formats, failures = {}, {}
+    values = pd.Series(['06/10/2023', '07/01/2023', 'n/a', None], name=COLUMN)
+    parsed = parse_dates(values, formats=formats, failures=failures)
+    assert formats == {COLUMN: '%m/%d/%Y'}
+    assert failures == {COLUMN: 1}
+    assert parsed.isna().tolist() == [False, False, True, True]
+    # A later parse of the same column in the same call reuses the cached format
+    formats[COLUMN] = '%d/%m/%Y'
+    assert parse_dates(pd.Series(['06/10/2023'], name=COLUMN), formats=formats).iloc[0] == pd.Timestamp('2023-10-06')
+    # Without a cache the format is inferred from the values alone
+    assert parse_dates(pd.Series(['06/10/2023'], name=COLUMN)).iloc[0] == pd.Timestamp('2023-06-10')
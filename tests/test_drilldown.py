@@ -0,0 +1,27 @@
+import pandas as pd
+
+from drilldown import iter_client_drilldown
+from metrics import calculate_all_metrics
+from synthetic import make_export
+
+# The drill-down is built chunk by chunk; the chunking must not change any client's row, and the per-client flags
+# must add up to the report.
+
+START, END = pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')
+
+
+def _drilldown(export: dict, chunk_clients: int) -> pd.DataFrame:
+    chunks = iter_client_drilldown({name: df.copy() for name, df in export.items()}, START, END, chunk_clients)
+    return pd.concat(chunks).sort_values('Client_Id').reset_index(drop=True)
+
+
+def test_chunks_match_a_single_pass_and_the_report():
+    export = make_export(n_clients=400, n_interactions=4000, seed=5)
+    whole = _drilldown(export, chunk_clients=10_000)
+    chunked = _drilldown(export, chunk_clients=50)
+    pd.testing.assert_frame_equal(chunked, whole)
+    report = calculate_all_metrics(export, START, END).set_index('Metric')['Value']
+    assert whole['m1_inbound_referrals'].sum() == report['Number of Inbound Referrals into the CCH']
+    assert whole['m3_enrolled'].sum() == report['Number of Enrolled Clients']
+    assert whole['m6_newly_enrolled'].sum() == report['Number of Newly Enrolled Clients']
+    assert whole['m8_connected_7_days'].sum() == report['Number of newly enrolled clients connected to CBCC services within 7 days of referral']
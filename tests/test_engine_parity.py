@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from metrics import CLIENT_ID_COLUMNS, calculate_all_metrics
+from synthetic import make_export
+
+# Every engine must reproduce the pandas reference (metrics.py) row for row: same metrics, same order, same values.
+
+DATE_RANGES = [
+    ('2023-01-01', '2023-12-31'),
+    ('2023-03-01', '2023-03-31'),
+    ('2022-01-01', '2024-12-31'),
+]
+EXPORTS = [
+    pytest.param(dict(n_clients=200, n_interactions=2000, seed=0), id='small'),
+    pytest.param(dict(n_clients=400, n_interactions=4000, seed=1), id='medium'),
+    pytest.param(dict(n_clients=300, n_interactions=3000, seed=2, as_excel=True), id='excel-dtypes'),
+]
+
+
+def _report(export: dict, start: str, end: str, engine: str) -> pd.DataFrame:
+    # Engines may parse date columns in place, so each run gets its own copy of the sheets
+    sheets = {name: df.copy() for name, df in export.items()}
+    return calculate_all_metrics(sheets, pd.Timestamp(start), pd.Timestamp(end), engine=engine)
+
+
+@pytest.mark.parametrize('export_args', EXPORTS)
+@pytest.mark.parametrize('engine', ['polars', 'fused'])
+def test_engine_matches_pandas(engine, export_args):
+    if engine == 'polars':
+        pytest.importorskip('polars')
+    export = make_export(**export_args)
+    for start, end in DATE_RANGES:
+        expected = _report(export, start, end, 'pandas')
+        actual = _report(export, start, end, engine)
+        assert actual['Metric'].tolist() == expected['Metric'].tolist(), (start, end)
+        pd.testing.assert_series_equal(actual['Value'].astype(float), expected['Value'].astype(float), check_names=False, obj=f'{engine} {start}..{end}')
+
+
+def _mixed_client_ids(export: dict) -> dict:
+    # Every other row stores its client id as text, as an Excel column typed by hand does: 12 on one row, '12' on the next
+    sheets = {}
+    for name, df in export.items():
+        df = df.copy()
+        for col in [col for col in CLIENT_ID_COLUMNS if col in df.columns]:
+            ids = df[col].astype(object)
+            text = (pd.Series(range(len(df)), index=df.index) % 2 == 1) & ids.notnull()
+            df[col] = ids.where(~text, ids[text].map(lambda value: str(int(value))))
+        sheets[name] = df
+    return sheets
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'polars', 'fused'])
+def test_mixed_client_ids_match_clean_export(engine):
+    if engine == 'polars':
+        pytest.importorskip('polars')
+    export = make_export(n_clients=300, n_interactions=3000, seed=6)
+    mixed = _mixed_client_ids(export)
+    for start, end in DATE_RANGES:
+        expected = _report(export, start, end, 'pandas')
+        actual = _report(mixed, start, end, engine)
+        assert actual['Metric'].tolist() == expected['Metric'].tolist(), (start, end)
+        pd.testing.assert_series_equal(actual['Value'].astype(float), expected['Value'].astype(float), check_names=False, obj=f'{engine} {start}..{end}')
+
+
+@pytest.mark.parametrize('engine', ['polars', 'fused'])
+def test_missing_referral_date_column_matches_pandas(engine):
+    if engine == 'polars':
+        pytest.importorskip('polars')
+    export = make_export(n_clients=200, n_interactions=2000, seed=7)
+    export['Client'] = export['Client'].drop(columns=['ClientSystem_CcProgramReferralDate'])
+    for start, end in DATE_RANGES:
+        expected = _report(export, start, end, 'pandas')
+        actual = _report(export, start, end, engine)
+        assert actual['Metric'].tolist() == expected['Metric'].tolist(), (start, end)
+        pd.testing.assert_series_equal(actual['Value'].astype(float), expected['Value'].astype(float), check_names=False, obj=f'{engine} {start}..{end}')
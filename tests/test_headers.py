@@ -0,0 +1,104 @@
+import zipfile
+
+import openpyxl
+import pytest
+
+from dataset import read_xlsx_headers, required_columns, validate_export
+
+# The pre-flight check reads the first row of each sheet straight from the workbook XML; it must give the same
+# headers as openpyxl does, whichever way the cells store their text.
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Client headers are shared strings: a phonetic run (<rPh>) that is not part of the text, rich text runs, an
+# escaped entity and a blank entry. Interaction headers are inline strings, one with a phonetic run too.
+SHARED_STRINGS = [
+    '<si><t>Client_Id</t><rPh sb="0" eb="6"><t>クライアント</t></rPh><phoneticPr fontId="1"/></si>',
+    '<si><r><t>ClientOption_</t></r><r><rPr><b/></rPr><t>AhpClientStatus</t></r></si>',
+    '<si><t>Referral &amp; Intake</t></si>',
+    '<si/>',
+    '<si><t xml:space="preserve">Client_CreateStamp</t></si>',
+]
+CLIENT_ROW = '<c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c><c r="D1" t="s"><v>4</v></c><c r="E1"><v>5</v></c>'
+INTERACTION_ROW = (
+    '<c r="A1" t="inlineStr"><is><t>Client_Id</t><rPh sb="0" eb="6"><t>クライアント</t></rPh></is></c>'
+    '<c r="B1" t="inlineStr"><is><r><t>Interaction_</t></r><r><t>CreateStamp</t></r></is></c>'
+    '<c r="C1" t="inlineStr"><is><t>Outcome &lt;final&gt;</t></is></c>'
+)
+
+
+def _sheet(first_row: str) -> str:
+    return f'<worksheet xmlns="{MAIN_NS}"><sheetData><row r="1">{first_row}</row><row r="2"><c r="A2"><v>1</v></c></row></sheetData></worksheet>'
+
+
+def _write_workbook(path: str) -> None:
+    parts = {
+        '[Content_Types].xml': (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet2.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            '</Types>'
+        ),
+        '_rels/.rels': (
+            f'<Relationships xmlns="{PACKAGE_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>'
+            '<sheet name="Client" sheetId="1" r:id="rId1"/><sheet name="Interaction" sheetId="2" r:id="rId2"/>'
+            '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            f'<Relationships xmlns="{PACKAGE_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{REL_NS}/worksheet" Target="/xl/worksheets/sheet2.xml"/>'
+            f'<Relationship Id="rId3" Type="{REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/worksheets/sheet1.xml': _sheet(CLIENT_ROW),
+        'xl/worksheets/sheet2.xml': _sheet(INTERACTION_ROW),
+        'xl/sharedStrings.xml': f'<sst xmlns="{MAIN_NS}" count="{len(SHARED_STRINGS)}" uniqueCount="{len(SHARED_STRINGS)}">{"".join(SHARED_STRINGS)}</sst>',
+    }
+    with zipfile.ZipFile(path, 'w') as xlsx:
+        for name, xml in parts.items():
+            xlsx.writestr(name, xml)
+
+
+def _openpyxl_headers(path: str) -> dict:
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    headers = {}
+    for sheet in workbook.worksheets:
+        row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True))
+        headers[sheet.title] = [str(value) for value in row if value is not None and value != '']
+    workbook.close()
+    return headers
+
+
+def test_headers_match_openpyxl(tmp_path):
+    path = str(tmp_path / 'export.xlsx')
+    _write_workbook(path)
+    headers = read_xlsx_headers(path)
+    assert headers == _openpyxl_headers(path)
+    assert headers['Client'] == ['Client_Id', 'ClientOption_AhpClientStatus', 'Referral & Intake', 'Client_CreateStamp', '5']
+    assert headers['Interaction'] == ['Client_Id', 'Interaction_CreateStamp', 'Outcome <final>']
+
+
+def test_validate_export_catches_a_renamed_column(tmp_path):
+    path = str(tmp_path / 'export.xlsx')
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for sheet, cols in required_columns().items():
+        workbook.create_sheet(sheet).append(['Client_CreateStamp' if col == 'ClientSystem_CcProgramReferralDate' else col for col in cols])
+    workbook.save(path)
+    assert validate_export(path, [7]) == []
+    problems = validate_export(path)
+    assert problems == ["Sheet 'Client' is missing column(s): ClientSystem_CcProgramReferralDate"]
+    with pytest.raises(ValueError, match='ClientSystem_CcProgramReferralDate'):
+        validate_export(path, strict=True)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from metrics import calculate_all_metrics
+from preview import preview_metrics, sample_clients
+from synthetic import make_export
+
+# A preview of a small export is the report itself; on a larger one it is an estimate from a client sample that is
+# fixed by the Client_Id hash, so the same export always gives the same preview.
+
+START, END = pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')
+
+
+def test_small_export_is_previewed_exactly():
+    export = make_export(n_clients=200, n_interactions=2000, seed=11)
+    preview = preview_metrics(export, START, END, max_clients=500)
+    expected = calculate_all_metrics(export, START, END)
+    assert not preview['Approximate'].any()
+    pd.testing.assert_frame_equal(preview[['Metric', 'Value', 'Description']], expected)
+    assert preview['Lower'].equals(preview['Value']) and preview['Upper'].equals(preview['Value'])
+
+
+def test_sample_is_the_same_on_every_run():
+    export = make_export(n_clients=3000, n_interactions=20000, seed=11)
+    first, first_fraction, first_groups = sample_clients(export, max_clients=1000)
+    second, second_fraction, second_groups = sample_clients({name: df.copy() for name, df in export.items()}, max_clients=1000)
+    assert 0 < first_fraction < 1 and first_fraction == second_fraction
+    for name in export:
+        pd.testing.assert_frame_equal(first[name], second[name], obj=name)
+    for name in first_groups:
+        np.testing.assert_array_equal(first_groups[name], second_groups[name], err_msg=name)
+    # Every sampled client keeps all of its rows
+    sampled_ids = set(first['Client']['Client_Id'])
+    assert len(first['Interaction']) == export['Interaction']['Client_Id'].isin(sampled_ids).sum()
+
+
+def test_bounds_are_finite_and_contain_the_full_value():
+    # The bounds are 95% intervals, so this holds for most samples rather than all; the sample of this export is fixed
+    export = make_export(n_clients=3000, n_interactions=20000, seed=11)
+    preview = preview_metrics(export, START, END, max_clients=1000)
+    full = calculate_all_metrics(export, START, END)['Value'].astype(float)
+    lower, upper = preview['Lower'].astype(float), preview['Upper'].astype(float)
+    assert preview['Approximate'].all()
+    assert np.isfinite(lower).all() and np.isfinite(upper).all()
+    assert ((lower <= full) & (full <= upper)).all(), preview.assign(Full=full)[(full < lower) | (full > upper)]
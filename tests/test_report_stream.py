@@ -0,0 +1,52 @@
+import csv
+import json
+
+import pandas as pd
+
+import metrics
+from metrics import iter_metrics
+from report_stream import stream_report
+from synthetic import make_export
+
+START, END = pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')
+
+
+def test_failed_connection_computation_reports_its_error(monkeypatch):
+    def fail(*args):
+        raise RuntimeError('referral dates unreadable')
+    monkeypatch.setattr(metrics, 'calculate_days_to_connection', fail)
+    rows = {row['Metric']: row for row in iter_metrics(make_export(), START, END)}
+    for title in [
+        'Number of newly enrolled clients connected to CBCC services within 7 days of referral',
+        'Number of newly enrolled clients connected to CBCC services within 30 days of referral',
+        'Number of newly enrolled clients connected to CBCC services within 90 days of referral',
+        'Median days from referral to CBCC services connection',
+    ]:
+        assert rows[title]['Status'] == 'error: referral dates unreadable'
+        assert rows[title]['Value'] is None
+    # Metrics computed from #8/#9 are skipped; the rest are still computed
+    assert rows['Percent of newly enrolled clients connected to CBCC services within 7 days of referral.']['Status'].startswith('skipped')
+    assert rows['Number of Enrolled Clients']['Status'] == 'ok'
+
+
+def test_output_format_follows_extension(tmp_path):
+    json_rows = stream_report(make_export(), START, END, str(tmp_path / 'report.json'))
+    with open(tmp_path / 'report.json') as f:
+        report = json.load(f)
+    assert [row['Metric'] for row in report] == [row['Metric'] for row in json_rows]
+    stream_report(make_export(), START, END, str(tmp_path / 'report.jsonl'))
+    with open(tmp_path / 'report.jsonl') as f:
+        lines = [json.loads(line) for line in f]
+    assert [row['Metric'] for row in lines] == [row['Metric'] for row in json_rows]
+
+
+def test_csv_report_keeps_the_error(tmp_path, monkeypatch):
+    def fail(*args):
+        raise RuntimeError('referral dates unreadable')
+    monkeypatch.setattr(metrics, 'calculate_days_to_connection', fail)
+    stream_report(make_export(), START, END, str(tmp_path / 'report.csv'))
+    with open(tmp_path / 'report.csv', newline='', encoding='utf-8') as f:
+        rows = {row['Metric']: row for row in csv.DictReader(f)}
+    failed = rows['Median days from referral to CBCC services connection']
+    assert (failed['Value'], failed['Status']) == ('', 'error: referral dates unreadable')
+    assert rows['Number of Enrolled Clients']['Status'] == 'ok'
@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+import shared_dataset
+from metrics import calculate_all_metrics
+from shared_dataset import attach_dataset, calculate_all_metrics_for_ranges, publish_dataset, release_dataset
+from synthetic import make_export
+
+# Worker processes see the sheets through a published Arrow dataset; their reports must match in-process runs, and
+# the published files must be gone once the run is over, whether it succeeded or not.
+
+DATE_RANGES = [
+    (pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')),
+    (pd.Timestamp('2023-03-01'), pd.Timestamp('2023-03-31')),
+    (pd.Timestamp('2022-01-01'), pd.Timestamp('2024-12-31')),
+]
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    # Arrow-backed and numpy-backed columns compared by value, with every kind of missing value as None
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch) -> str:
+    monkeypatch.setattr(shared_dataset, 'SHARED_DIR', str(tmp_path))
+    return str(tmp_path)
+
+
+def test_attach_returns_the_published_sheets(shared_dir):
+    export = make_export(n_clients=50, n_interactions=200, seed=9)
+    path = publish_dataset(export)
+    assert os.path.dirname(path) == shared_dir
+    attached = attach_dataset(path)
+    assert list(attached) == list(export)
+    for name, df in export.items():
+        pd.testing.assert_frame_equal(_plain(attached[name]), _plain(df), obj=name)
+    release_dataset(path)
+    assert os.listdir(shared_dir) == []
+
+
+def test_ranges_match_in_process_runs_and_release_the_files(shared_dir):
+    export = make_export(n_clients=200, n_interactions=2000, seed=10)
+    reports = calculate_all_metrics_for_ranges(export, DATE_RANGES, processes=2)
+    assert len(reports) == len(DATE_RANGES)
+    for (start, end), actual in zip(DATE_RANGES, reports):
+        expected = calculate_all_metrics({name: df.copy() for name, df in export.items()}, start, end)
+        assert actual['Metric'].tolist() == expected['Metric'].tolist()
+        pd.testing.assert_series_equal(actual['Value'].astype(float), expected['Value'].astype(float), check_names=False, obj=f'{start}..{end}')
+    assert os.listdir(shared_dir) == []
+
+
+def test_files_are_released_when_a_worker_raises(shared_dir):
+    with pytest.raises(ValueError, match='Unknown metric engine'):
+        calculate_all_metrics_for_ranges(make_export(n_clients=50, n_interactions=200), DATE_RANGES[:1], engine='missing', processes=1)
+    assert os.listdir(shared_dir) == []
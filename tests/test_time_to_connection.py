@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+import metrics
+from metrics import calculate_connection_distribution, connected_within, get_engine
+
+# Days to connection are measured from ClientSystem_CcProgramReferralDate to the first qualifying event. A client
+# whose first event is dated before the referral was already connected when referred: day 0, never negative.
+
+START, END = pd.Timestamp('2023-01-01'), pd.Timestamp('2023-12-31')
+
+
+def _sheets() -> dict:
+    client = pd.DataFrame({
+        'Client_Id': [1, 2, 3, 4],
+        'ClientSystem_CcProgramReferralDate': pd.to_datetime(['2023-06-10', '2023-06-10', '2023-06-10', '2023-06-10']),
+    })
+    interaction = pd.DataFrame({
+        'Client_Id': [1, 1, 2, 3],
+        'InteractionOption_ContactOutcome': ['Care Coordination', 'Care Coordination', 'Referral to Services', 'No Answer'],
+        # Client 1 was served eight months before the referral, and again after it
+        'Interaction_CreateStamp': pd.to_datetime(['2022-10-01', '2023-06-20', '2023-06-15', '2023-06-11']),
+    })
+    ahpscreening = pd.DataFrame({
+        'Client_Id': [3],
+        'AhpscreeningSystem_DateAcceptedcompleted': pd.to_datetime(['2023-07-30']),
+    })
+    return {'Client': client, 'Interaction': interaction, 'Ahpscreening': ahpscreening}
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'polars', 'fused'])
+def test_events_before_referral_count_as_day_zero(engine):
+    if engine == 'polars':
+        pytest.importorskip('polars')
+    m = get_engine(engine)
+    sheets = m.prepare_data(_sheets(), START, END)
+    days = m.calculate_days_to_connection(sheets['Client'], sheets['Interaction'], sheets['Ahpscreening'], [1, 2, 3, 4])
+    assert days.to_dict() == pytest.approx({1: 0.0, 2: 5.0, 3: 50.0, 4: float('nan')}, nan_ok=True)
+    distribution = calculate_connection_distribution(days)
+    assert min(distribution['histogram']) == 0
+    assert distribution['quantiles'][0.5] == 5.0
+    assert connected_within(distribution, 7) == 2
+    assert connected_within(distribution, 30) == 2
+    assert connected_within(distribution, 60) == 3
+
+
+def test_window_metrics_match_distribution():
+    sheets = _sheets()
+    assert metrics.calculate_newly_enrolled_clients_connected_to_cbcc_7_days(sheets['Client'], sheets['Interaction'], sheets['Ahpscreening'], [1, 2, 3, 4]) == 2
+    assert metrics.calculate_newly_enrolled_clients_connected_to_cbcc_30_days(sheets['Client'], sheets['Interaction'], sheets['Ahpscreening'], [1, 2, 3, 4]) == 2